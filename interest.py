@@ -0,0 +1,63 @@
+"""Interest management for host broadcasts.
+
+Entities are bucketed into a uniform grid of square cells on the x/z plane.
+How relevant an entity is to a viewer depends on how many cells apart they
+are: close entities are sent every tick, entities in the outer ring only
+every few ticks, and anything further away is not sent at all.
+"""
+import math
+
+NEAR = 2
+FAR = 1
+NONE = 0
+
+
+class InterestGrid:
+    def __init__(self, cell_size=10.0, near_radius=2, far_radius=5, far_interval=3):
+        self.cell_size = cell_size
+        self.near_radius = near_radius  # Cells around the viewer updated every tick
+        self.far_radius = far_radius  # Cells around the viewer updated every far_interval ticks
+        self.far_interval = far_interval
+        self.cells = {}  # entity id -> (cell x, cell z)
+
+    def cell_of(self, position):
+        return (math.floor(position[0] / self.cell_size), math.floor(position[2] / self.cell_size))
+
+    def update(self, entity_id, position):
+        self.cells[entity_id] = self.cell_of(position)
+
+    def remove(self, entity_id):
+        self.cells.pop(entity_id, None)
+
+    def _ring(self, viewer_cell, cell):
+        return max(abs(viewer_cell[0] - cell[0]), abs(viewer_cell[1] - cell[1]))
+
+    def _relevance_of_cell(self, viewer_id, cell):
+        viewer_cell = self.cells.get(viewer_id)
+        if viewer_cell is None or cell is None:
+            return NEAR  # Don't filter until we know where both are
+        ring = self._ring(viewer_cell, cell)
+        if ring <= self.near_radius:
+            return NEAR
+        if ring <= self.far_radius:
+            return FAR
+        return NONE
+
+    def relevance(self, viewer_id, entity_id):
+        return self._relevance_of_cell(viewer_id, self.cells.get(entity_id))
+
+    def relevance_of_position(self, viewer_id, position):
+        return self._relevance_of_cell(viewer_id, self.cell_of(position))
+
+    def should_send(self, viewer_id, entity_id, tick):
+        """Whether an update for entity_id goes in the snapshot numbered tick for viewer_id.
+
+        tick should count the snapshots this viewer was actually sent. Server
+        ticks with some skipped by rate control can keep landing on the same
+        far entities and starve the others.
+        """
+        relevance = self.relevance(viewer_id, entity_id)
+        if relevance == FAR:
+            # Spread throttled entities over the interval instead of sending them all on one tick
+            return (tick + hash(entity_id)) % self.far_interval == 0
+        return relevance == NEAR
@@ -0,0 +1,114 @@
+"""Snapshot interpolation for remote players.
+
+Remote players are drawn `delay` seconds behind the newest snapshot so there
+are nearly always two snapshots to interpolate between. If snapshots stop
+arriving the last known motion is extrapolated for a short window and then
+held.
+"""
+from collections import deque
+
+DEFAULT_DELAY = 0.15  # Should be 1.5-2x the interval between updates from the sender
+DEFAULT_MAX_SNAPSHOTS = 32
+DEFAULT_MAX_EXTRAPOLATION = 0.1
+DEFAULT_IDLE_AFTER = 0.2
+
+
+def lerp(a, b, t):
+    return tuple(x + (y - x) * t for x, y in zip(a, b))
+
+
+def lerp_angles(a, b, t):
+    """Interpolate euler angles in degrees along the shortest way round."""
+    return tuple(x + ((y - x + 180) % 360 - 180) * t for x, y in zip(a, b))
+
+
+class SnapshotBuffer:
+    """Timestamped jitter buffer for one remote entity."""
+
+    def __init__(self, delay=DEFAULT_DELAY, max_snapshots=DEFAULT_MAX_SNAPSHOTS,
+                 max_extrapolation=DEFAULT_MAX_EXTRAPOLATION, idle_after=DEFAULT_IDLE_AFTER):
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.idle_after = idle_after  # Re-sample an unchanged state after this long so it reads as standing still
+        self.snapshots = deque(maxlen=max_snapshots)  # (timestamp, position, rotation)
+        self.last_heard = 0  # Newest time the sender vouched for the newest snapshot
+
+    @property
+    def max_snapshots(self):
+        return self.snapshots.maxlen
+
+    @max_snapshots.setter
+    def max_snapshots(self, value):
+        self.snapshots = deque(self.snapshots, maxlen=value)
+
+    def add(self, timestamp, position, rotation):
+        position = tuple(position)
+        rotation = tuple(rotation)
+        if self.snapshots:
+            newest_time, newest_position, newest_rotation = self.snapshots[-1]
+            if timestamp <= newest_time:
+                return  # Out of order
+            self.last_heard = max(self.last_heard, timestamp)
+            # A state that hasn't changed only tells us the sender is still there. Storing it
+            # as a new snapshot would make movement at a lower send rate stutter.
+            if (position == newest_position and rotation == newest_rotation and
+                    timestamp - newest_time < self.idle_after):
+                return
+        self.last_heard = max(self.last_heard, timestamp)
+        self.snapshots.append((timestamp, position, rotation))
+
+    def sample(self, now):
+        """Return the (position, rotation) to draw at local time now, or None if empty."""
+        if not self.snapshots:
+            return None
+
+        render_time = now - self.delay
+        oldest_time, oldest_position, oldest_rotation = self.snapshots[0]
+        if render_time <= oldest_time:
+            return oldest_position, oldest_rotation
+
+        newest_time, newest_position, newest_rotation = self.snapshots[-1]
+        if render_time >= newest_time:
+            return self._extrapolate(render_time)
+
+        # Walk back from the newest end, render time is nearly always close to it
+        for i in range(len(self.snapshots) - 1, 0, -1):
+            start_time, start_position, start_rotation = self.snapshots[i - 1]
+            if start_time <= render_time:
+                end_time, end_position, end_rotation = self.snapshots[i]
+                t = (render_time - start_time) / (end_time - start_time)
+                return lerp(start_position, end_position, t), lerp_angles(start_rotation, end_rotation, t)
+        return oldest_position, oldest_rotation
+
+    def _extrapolate(self, render_time):
+        newest_time, newest_position, newest_rotation = self.snapshots[-1]
+        # Still hearing about the newest state, so it just hasn't moved
+        if render_time <= self.last_heard or len(self.snapshots) < 2:
+            return newest_position, newest_rotation
+
+        previous_time, previous_position, previous_rotation = self.snapshots[-2]
+        span = newest_time - previous_time
+        ahead = min(render_time - newest_time, self.max_extrapolation)
+        t = 1 + ahead / span
+        return lerp(previous_position, newest_position, t), lerp_angles(previous_rotation, newest_rotation, t)
+
+
+class ClockOffset:
+    """Maps the host's clock onto ours from the send times stamped on snapshots."""
+
+    def __init__(self, drift_rate=0.01):
+        self.drift_rate = drift_rate
+        self.offset = None  # local time - host time
+
+    def update(self, host_time, local_time):
+        sample = local_time - host_time
+        # The smallest sample had the least network delay, so jump down to it at once
+        # and only creep upwards in case the clocks drift apart
+        if self.offset is None or sample < self.offset:
+            self.offset = sample
+        else:
+            self.offset += (sample - self.offset) * self.drift_rate
+        return self.offset
+
+    def to_local(self, host_time):
+        return host_time + (self.offset or 0.0)
@@ -0,0 +1,135 @@
+"""Lag compensation for hit checks on the host.
+
+A client aims at remote players and enemies as it draws them, which is
+interpolation delay plus half a round trip behind the host by the time its
+shot arrives. The host keeps a short history of where every entity was and
+checks shots against the positions the shooter was looking at, never
+rewinding further than max_rewind so laggy clients can't hit targets that
+have long since moved on.
+"""
+import math
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import islice
+
+from collision import segment_sphere
+from interpolation import DEFAULT_DELAY, lerp
+from simulation import BULLET_LIFETIME, BULLET_SPEED, HIT_RADIUS
+
+MAX_REWIND = 0.3  # Seconds
+HISTORY_LENGTH = 1.0  # Seconds of positions kept
+SHOT_MEMORY = 2.0  # Seconds a shot can still back up a damage claim
+MAX_SHOT_DAMAGE = 40  # The hardest hitting weapon, the shotgun; shots don't say which weapon fired them
+
+
+class LagCompensator:
+    def __init__(self, max_rewind=MAX_REWIND, history_length=HISTORY_LENGTH,
+                 interpolation_delay=DEFAULT_DELAY, hit_radius=HIT_RADIUS, max_damage=MAX_SHOT_DAMAGE):
+        self.max_rewind = max_rewind
+        self.history_length = history_length
+        self.interpolation_delay = interpolation_delay  # How far behind clients draw other entities
+        self.hit_radius = hit_radius
+        self.max_damage = max_damage  # Most damage one shot can back up
+        self.frames = deque()  # (time, {entity id: position}), oldest first
+        self.shots = {}  # shooter id -> deque of (view time, origin, direction)
+        self.stats = {
+            'shots': 0,
+            'rewind_avg': 0.0,  # Seconds, smoothed
+            'clamped': 0,  # Shots that wanted to rewind further than max_rewind
+            'damage_accepted': 0,
+            'damage_rejected': 0
+        }
+
+    def record(self, now, positions):
+        """Store where every entity is at time now. Call once per host tick."""
+        self.frames.append((now, dict(positions)))
+        while self.frames and now - self.frames[0][0] > self.history_length:
+            self.frames.popleft()
+
+    def view_time(self, received, rtt):
+        """The host time the shooter was seeing when it fired a shot that arrived at received."""
+        rewind = (rtt or 0.0) / 2 + self.interpolation_delay
+        if rewind > self.max_rewind:
+            self.stats['clamped'] += 1
+            rewind = self.max_rewind
+        return received - rewind
+
+    def positions_at(self, t):
+        """Entity positions at time t, interpolated between the recorded frames around it."""
+        if not self.frames:
+            return {}
+        if t <= self.frames[0][0]:
+            return self.frames[0][1]
+        # First frame at or after t; frames are in time order, so no need to walk them
+        i = bisect_left(self.frames, t, key=_frame_time)
+        if i == len(self.frames):
+            return self.frames[-1][1]
+        (t0, before), (t1, after) = self.frames[i - 1], self.frames[i]
+        f = (t - t0) / (t1 - t0) if t1 > t0 else 1.0
+        # Entities that only exist on one side of t aren't interpolated
+        return {entity_id: lerp(before[entity_id], position, f) if entity_id in before else position
+                for entity_id, position in after.items()}
+
+    def trace(self, origin, direction, start_time, end_time, speed=BULLET_SPEED, exclude=()):
+        """Fly a bullet fired at start_time through the history until end_time.
+
+        Returns (entity id, time of the hit) for the first entity it passes
+        within hit_radius of, or None.
+        """
+        length = math.sqrt(sum(v * v for v in direction)) or 1
+        direction = tuple(v / length for v in direction)
+        end_time = min(end_time, start_time + BULLET_LIFETIME)
+
+        # Step from frame to frame so each segment is checked against where the targets were
+        first = bisect_right(self.frames, start_time, key=_frame_time)
+        last = bisect_left(self.frames, end_time, key=_frame_time)
+        times = [start_time] + [t for t, _ in islice(self.frames, first, last)] + [end_time]
+        position = tuple(origin)
+        for t0, t1 in zip(times, times[1:]):
+            next_position = tuple(p + v * speed * (t1 - t0) for p, v in zip(position, direction))
+            targets = self.positions_at(t1)
+            hits = [(t, entity_id) for entity_id, t in
+                    ((entity_id, segment_sphere(position, next_position, target, self.hit_radius))
+                     for entity_id, target in targets.items() if entity_id not in exclude)
+                    if t is not None]
+            if hits:
+                # The one the bullet touches earliest along this step was reached first
+                t, entity_id = min(hits)
+                return entity_id, t0 + (t1 - t0) * t
+            position = next_position
+        return None
+
+    def add_shot(self, shooter_id, origin, direction, received, rtt):
+        """Remember a shot so damage the shooter reports later can be checked. Returns its view time."""
+        view_time = self.view_time(received, rtt)
+        stats = self.stats
+        stats['shots'] += 1
+        stats['rewind_avg'] += ((received - view_time) - stats['rewind_avg']) * 0.1
+
+        shots = self.shots.setdefault(shooter_id, deque())
+        shots.append((view_time, tuple(origin), tuple(direction)))
+        while shots and received - shots[0][0] > SHOT_MEMORY:
+            shots.popleft()
+        return view_time
+
+    def validate_damage(self, shooter_id, target_id, amount, now):
+        """True if one of the shooter's recent shots hits target_id in the rewound history.
+
+        The shot that matched is used up, so each shot backs up one claim of at
+        most max_damage.
+        """
+        shots = self.shots.get(shooter_id, ())
+        if amount <= self.max_damage:
+            for shot in shots:
+                view_time, origin, direction = shot
+                hit = self.trace(origin, direction, view_time, now, exclude=(shooter_id,))
+                if hit and hit[0] == target_id:
+                    shots.remove(shot)
+                    self.stats['damage_accepted'] += 1
+                    return True
+        self.stats['damage_rejected'] += 1
+        return False
+
+
+def _frame_time(frame):
+    return frame[0]
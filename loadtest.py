@@ -0,0 +1,208 @@
+"""Load generator for finding out how many players a host can handle.
+
+Starts bot clients in one process, each a NetworkManager with its own
+socket, that connect, run around in circles sending player updates, shoot
+and ping the host at fixed rates. The bot count is stepped up and each step
+reports host tick time, packets per second, dropped snapshots and ping
+percentiles:
+
+    python loadtest.py --bots 5,10,20,40 --duration 10
+
+By default the host is a DedicatedServer started in this process so its tick
+time can be measured. Pass --host/--port to load an external host instead.
+"""
+import argparse
+import math
+import random
+import threading
+import time
+
+from network import NetworkManager
+from server import DedicatedServer
+
+FRAME_INTERVAL = 1 / 60  # How often bots are updated
+FIRST_BOT_ID = 9000  # Bots are players 9000, 9001, ...
+
+
+class Bot(NetworkManager):
+    """A scripted client. Counts gaps in the snapshot sequence and records ping round trips."""
+
+    def __init__(self, index, host, port, update_rate=20, shoot_rate=2, ping_rate=2, room_id=None):
+        super().__init__(is_host=False, host=host, port=port, room_id=room_id)
+        self.player_id = str(FIRST_BOT_ID + index)
+        self.update_interval = 1 / update_rate
+        self.shoot_interval = 1 / shoot_rate if shoot_rate else None
+        self.ping_interval = 1 / ping_rate
+        self.next_update = self.next_shoot = self.next_ping = 0
+
+        # Walk a circle of its own somewhere in the arena
+        self.center = (random.uniform(-35, 35), 0, random.uniform(-35, 35))
+        self.radius = random.uniform(3, 10)
+        self.phase = random.uniform(0, 2 * math.pi)
+
+        self.rtts = []
+        self.snapshots = 0
+        self.snapshot_gaps = 0
+        self.last_snapshot = None
+
+    def on_pong(self, rtt):
+        self.rtts.append(rtt)
+
+    def _handle_snapshot(self, message):
+        sequence = message['sequence']
+        if self.last_snapshot is not None and sequence > self.last_snapshot:
+            self.snapshot_gaps += sequence - self.last_snapshot - 1
+        if self.last_snapshot is None or sequence > self.last_snapshot:
+            self.last_snapshot = sequence
+        self.snapshots += 1
+        super()._handle_snapshot(message)
+
+    def step(self, now):
+        self.update()
+        if not self.connected:
+            return
+
+        if now >= self.next_update:
+            self.next_update = now + self.update_interval
+            angle = self.phase + now
+            position = (self.center[0] + math.cos(angle) * self.radius, 1.0,
+                        self.center[2] + math.sin(angle) * self.radius)
+            self.send_player_update(position, (0.0, math.degrees(angle), 0.0))
+        if self.shoot_interval and now >= self.next_shoot:
+            self.next_shoot = now + self.shoot_interval
+            angle = random.uniform(0, 2 * math.pi)
+            self.send_shoot((self.center[0], 1.5, self.center[2]), (math.cos(angle), 0.0, math.sin(angle)))
+        if now >= self.next_ping:
+            self.next_ping = now + self.ping_interval
+            self.send_ping()
+
+    def reset_stats(self):
+        self.rtts = []
+        self.snapshots = 0
+        self.snapshot_gaps = 0
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class LoadTest:
+    def __init__(self, host='127.0.0.1', port=5560, tick_rate=30, external=False,
+                 update_rate=20, shoot_rate=2, ping_rate=2, room_id=None):
+        self.host = host
+        self.port = port
+        self.bot_options = {'update_rate': update_rate, 'shoot_rate': shoot_rate, 'ping_rate': ping_rate,
+                            'room_id': room_id}
+        self.bots = []
+        self.server = None
+        if not external:
+            self.server = DedicatedServer(host=host, port=port, tick_rate=tick_rate, seed=0)
+
+    def start(self):
+        if self.server:
+            threading.Thread(target=self.server.run, daemon=True).start()
+            time.sleep(0.2)
+
+    def add_bots(self, count):
+        for _ in range(count):
+            bot = Bot(len(self.bots), self.host, self.port, **self.bot_options)
+            bot.start()
+            bot.send_connect()
+            self.bots.append(bot)
+
+    def run_step(self, duration):
+        """Run every bot for duration seconds and return the measurements for this step."""
+        for bot in self.bots:
+            bot.reset_stats()
+        network = self.server.network if self.server else None
+        if network:
+            server_stats = self.server.stats
+            server_stats['tick_time_max'] = 0.0
+            received_before = network.transport.stats['datagrams']
+            sent_before = network.tick_stats['packets_sent']
+
+        start = time.time()
+        while time.time() - start < duration:
+            frame_start = time.time()
+            for bot in self.bots:
+                bot.step(frame_start)
+            delay = FRAME_INTERVAL - (time.time() - frame_start)
+            if delay > 0:
+                time.sleep(delay)
+        elapsed = time.time() - start
+
+        rtts = [rtt for bot in self.bots for rtt in bot.rtts]
+        snapshots = sum(bot.snapshots for bot in self.bots)
+        gaps = sum(bot.snapshot_gaps for bot in self.bots)
+        result = {
+            'bots': len(self.bots),
+            'connected': sum(1 for bot in self.bots if bot.connected),
+            'snapshot_drop_rate': gaps / (snapshots + gaps) if snapshots + gaps else 0.0,
+            'ping_p50': percentile(rtts, 0.5),
+            'ping_p90': percentile(rtts, 0.9),
+            'ping_p99': percentile(rtts, 0.99),
+            'pings': len(rtts)
+        }
+        if network:
+            rates = list(network.effective_send_rates().values())
+            result.update({
+                'snapshot_rate_avg': sum(rates) / len(rates) if rates else 0.0,
+                'tick_time_avg': server_stats['tick_time_avg'],
+                'tick_time_max': server_stats['tick_time_max'],
+                'overruns': server_stats['overruns'],
+                'packets_in_per_second': (network.transport.stats['datagrams'] - received_before) / elapsed,
+                'packets_out_per_second': (network.tick_stats['packets_sent'] - sent_before) / elapsed
+            })
+        return result
+
+    def stop(self):
+        for bot in self.bots:
+            bot.stop()
+        if self.server:
+            self.server.stop()
+
+
+def format_result(result):
+    line = (f"{result['bots']:>5} bots ({result['connected']} connected)  "
+            f"ping p50/p90/p99 {result['ping_p50'] * 1000:6.1f}/{result['ping_p90'] * 1000:6.1f}/"
+            f"{result['ping_p99'] * 1000:6.1f} ms  "
+            f"snapshot drops {result['snapshot_drop_rate'] * 100:5.1f}%")
+    if 'tick_time_avg' in result:
+        line += (f"  tick {result['tick_time_avg'] * 1000:6.2f} ms avg {result['tick_time_max'] * 1000:6.2f} max  "
+                 f"{result['overruns']} overruns  snapshots/s {result['snapshot_rate_avg']:4.1f}  "
+                 f"pps in/out {result['packets_in_per_second']:7.0f}/{result['packets_out_per_second']:7.0f}")
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load a host with bot clients')
+    parser.add_argument('--bots', default='5,10,20,40', help='Comma separated bot counts to step through')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per step')
+    parser.add_argument('--host', default=None, help='Load an external host instead of starting one here')
+    parser.add_argument('--port', type=int, default=5560)
+    parser.add_argument('--tick-rate', type=int, default=30, help='Tick rate of the in-process server')
+    parser.add_argument('--update-rate', type=float, default=20, help='Player updates per second per bot')
+    parser.add_argument('--shoot-rate', type=float, default=2, help='Shots per second per bot')
+    parser.add_argument('--ping-rate', type=float, default=2, help='Pings per second per bot')
+    parser.add_argument('--room', type=int, default=None, help='Room to join when --host is a match server')
+    args = parser.parse_args()
+
+    test = LoadTest(host=args.host or '127.0.0.1', port=args.port, tick_rate=args.tick_rate,
+                    external=args.host is not None, update_rate=args.update_rate,
+                    shoot_rate=args.shoot_rate, ping_rate=args.ping_rate, room_id=args.room)
+    test.start()
+    try:
+        for count in (int(n) for n in args.bots.split(',')):
+            test.add_bots(count - len(test.bots))
+            print(format_result(test.run_step(args.duration)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        test.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,20 @@ from ursina import *
 from ursina.prefabs.first_person_controller import FirstPersonController
 from multiplayer_menu import MultiplayerMenu
 from network import NetworkManager
+from interpolation import SnapshotBuffer
+from movement import make_command, spawn_state
+from prediction import ClientPredictor
+from simulation import BOSS_PREFIX, FLOOR, HIT_RADIUS, WALLS
+from collision import CollisionWorld, box_from_center
+from spatial_hash import SpatialHash
+from projectiles import ProjectileSystem
+from scheduler import Scheduler
+from panda3d.core import Geom, GeomNode, GeomPoints, GeomVertexArrayFormat, GeomVertexData, GeomVertexFormat
+from panda3d.core import CollisionBox, OmniBoundingVolume
+from timestep import FixedTimestep
+from pool import ObjectPool
+from meshcache import MeshCache
+from panda3d.core import NodePath
 import random
 import time
 import math
@@ -10,8 +24,7 @@ import sys
 
 # Global variables
 player = None
-ground = None
-walls = []
+level = None  # Floor and walls, built by build_level() on the first start_game() and kept after that
 enemies = []
 bullets = []
 powerups = []
@@ -19,6 +32,17 @@ wave = 1  # Start from wave 1
 enemies_per_wave = 3
 game_over = False
 
+# Procedural meshes and loaded models, generated once and shared by every entity that uses them
+mesh_cache = MeshCache(on_evict=lambda mesh: mesh.removeNode())
+mesh_instances = NodePath('mesh_instances')  # Parent for copies until an entity takes them
+
+def shared_model(key, factory):
+    """A copy of the cached mesh for key, for one entity. Release the key when the entity goes away.
+    
+    The copy is a new node but shares the cached vertex data, so nothing is generated after the first call.
+    """
+    return mesh_cache.acquire(key, factory).copy_to(mesh_instances)
+
 def safe_load_model(model_name):
     """Safely load a model by name, falling back to basic shapes if needed."""
     # List of built-in models that don't require file loading
@@ -32,10 +56,10 @@ def safe_load_model(model_name):
         # Try with a direct path first
         model_path = os.path.join('assets', 'models', f"{model_name}.obj")
         if os.path.exists(model_path):
-            return loader.loadModel(model_path)
+            return shared_model(('file', model_path), lambda: loader.loadModel(model_path))
             
         # Try with just the model name
-        return loader.loadModel(model_name)
+        return shared_model(('file', model_name), lambda: loader.loadModel(model_name))
     except Exception as e:
         print(f"Warning: Could not load model '{model_name}': {str(e)}. Using cube as fallback.")
         return 'cube'  # Fallback to a basic cube
@@ -47,6 +71,8 @@ class StartMenu(Entity):
         self.player_id = str(id(self))[-4:]  # Generate a simple player ID
         self.is_multiplayer = False
         self.network_manager = None
+        self.remote_players = {}  # player id -> RemotePlayer
+        self.remote_enemies = {}  # enemy id -> RemoteEnemy, for enemies simulated by a dedicated server
         
         # Main menu
         self.menu = Entity(parent=self, enabled=True)
@@ -122,6 +148,22 @@ class StartMenu(Entity):
             color=color.white
         )
     
+    def start_singleplayer(self):
+        self.start_game()
+    
+    def show_multiplayer_menu(self):
+        self.menu.enabled = False
+        self.multiplayer_menu.enabled = True
+    
+    def restart_game(self):
+        """Start a new game in the same mode, replacing the last one's player, enemies and powerups"""
+        self.game_over_ui.enabled = False
+        self.game_ui.enabled = True
+        start_game()
+    
+    def return_to_menu(self):
+        self.back_to_main()
+    
     def start_game(self):
         """Start the game in single-player mode"""
         self.menu.enabled = False
@@ -130,7 +172,7 @@ class StartMenu(Entity):
         self.network_manager = None
         start_game()
     
-    def start_multiplayer(self, is_host, host='localhost', port=5555):
+    def start_multiplayer(self, is_host, host='localhost', port=5555, room_id=None):
         """Start a multiplayer game as either host or client"""
         self.menu.enabled = False
         self.game_ui.enabled = True
@@ -138,13 +180,17 @@ class StartMenu(Entity):
         
         try:
             # Initialize network manager
-            self.network_manager = NetworkManager(is_host=is_host, host=host, port=port)
+            self.network_manager = NetworkManager(is_host=is_host, host=host, port=port, room_id=room_id)
             self.network_manager.start()
             
             # Set up network callbacks
             self.network_manager.on_player_update = self.on_player_update
+            self.network_manager.on_player_removed = self.on_player_removed
+            self.network_manager.on_entity_update = self.on_entity_update
+            self.network_manager.on_entity_removed = self.on_entity_removed
             self.network_manager.on_shoot = self.on_remote_shoot
             self.network_manager.on_damage = self.on_remote_damage
+            self.network_manager.on_input_ack = self.on_input_ack
             
             # Connect to the server
             self.network_manager.send_connect()
@@ -155,6 +201,9 @@ class StartMenu(Entity):
             # Set the network manager for the player
             if player:
                 player.network_manager = self.network_manager
+                # The host checks client movement, so clients predict it locally
+                if not is_host:
+                    player.enable_prediction()
                 
         except Exception as e:
             print(f"Error starting multiplayer: {e}")
@@ -162,32 +211,72 @@ class StartMenu(Entity):
             self.status_text.color = color.red
             self.back_to_main()
     
-    def on_player_update(self, player_id, position, rotation):
+    def on_player_update(self, player_id, position, rotation, timestamp):
         """Handle player position/rotation updates from the network"""
-        # This would be called when receiving updates for other players
-        # You would update the corresponding player entity in the game
-        pass
+        remote = self.remote_players.get(player_id)
+        if remote is None:
+            remote = RemotePlayer(player_id=player_id, position=position)
+            self.remote_players[player_id] = remote
+        remote.snapshot_buffer.add(timestamp, position, rotation)
+    
+    def on_player_removed(self, player_id):
+        """Handle a player leaving the host's view"""
+        remote = self.remote_players.pop(player_id, None)
+        if remote:
+            destroy(remote)
+    
+    def on_entity_update(self, entity_id, position, rotation, timestamp):
+        """Handle enemy updates from a dedicated server"""
+        remote = self.remote_enemies.get(entity_id)
+        if remote is None:
+            remote = RemoteEnemy(entity_id, position=position)
+            self.remote_enemies[entity_id] = remote
+        remote.snapshot_buffer.add(timestamp, position, rotation)
+    
+    def on_entity_removed(self, entity_id):
+        """Handle an enemy dying or leaving the host's view"""
+        remote = self.remote_enemies.pop(entity_id, None)
+        if remote:
+            destroy(remote)
     
     def on_remote_shoot(self, message):
         """Handle shoot events from other players"""
-        # Create a bullet at the specified position and direction
         position = Vec3(*message['position'])
         direction = Vec3(*message['direction'])
-        bullet = Bullet(
+        
+        if self.network_manager and self.network_manager.is_host and 'view_time' in message:
+            # Fly the shot through what the shooter saw, as the dedicated server does,
+            # and only spawn a live bullet if it didn't hit an enemy on the way to now
+            now = time.time()
+            rewind = now - message['view_time']
+            hit = self.network_manager.lag_compensation.trace(
+                message['position'], message['direction'], message['view_time'], now,
+                exclude=(message['player_id'],))
+            target = hit and next((enemy for enemy in enemies if enemy.enemy_id == hit[0]), None)
+            if target and not target.dead:
+                target.take_damage(10)
+                return
+            position += direction.normalized() * 50 * rewind
+        
+        # Create a bullet at the specified position and direction
+        spawn_bullet(
             position=position,
             direction=direction,
-            enemies_list=enemies,
             speed=50,
             damage=10,
             owner_id=message['player_id']
         )
-        bullets.append(bullet)
+    
+    def on_input_ack(self, sequence, state):
+        """Handle the host's authoritative position for our own player"""
+        if player and player.predictor:
+            player.reconcile(sequence, state)
     
     def on_remote_damage(self, message):
         """Handle damage events from other players"""
         # Apply damage to the local player if they were hit
         if player and message['target_id'] == player.player_id:
-            player.take_damage(message['amount'], message['from_player'])
+            player.take_damage(message['amount'])
     
     def back_to_main(self):
         """Return to the main menu"""
@@ -199,6 +288,11 @@ class StartMenu(Entity):
         if self.network_manager:
             self.network_manager.stop()
             self.network_manager = None
+        
+        for remote in list(self.remote_players.values()) + list(self.remote_enemies.values()):
+            destroy(remote)
+        self.remote_players.clear()
+        self.remote_enemies.clear()
 
 # Create the Ursina application
 app = Ursina()
@@ -209,6 +303,7 @@ window.borderless = False
 window.fullscreen = False  # Start in windowed mode
 window.fps_counter.enabled = True
 window.exit_button.visible = False  # Hide the default exit button
+USE_PROJECTILE_SYSTEM = False  # Simulate bullets as NumPy arrays drawn as one node instead of one entity each
 
 # Add fullscreen toggle function
 def toggle_fullscreen():
@@ -239,6 +334,9 @@ powerups = []
 wave = 1
 enemies_per_wave = 3
 score = 0
+sim_clock = FixedTimestep()  # Bullets and enemies are simulated at a fixed rate, see scheduler below
+level_collision = CollisionWorld()  # Floor and walls, for bullet sweeps
+enemy_grid = SpatialHash()  # Live enemies by where they stand, so bullets only test the ones nearby
 
 # Weapon classes
 class Weapon(Entity):
@@ -315,13 +413,11 @@ class Weapon(Entity):
                 bullet_dir = self.forward
                 
             # Create bullet with the weapon's damage
-            bullet = Bullet(
+            spawn_bullet(
                 position=bullet_pos,
                 direction=bullet_dir,
-                enemies_list=enemies,
                 damage=self.damage
             )
-            bullets.append(bullet)
             
             # Play shoot sound
             try:
@@ -343,6 +439,8 @@ class Weapon(Entity):
         self.reloading = False
 
 class Player(FirstPersonController):
+    update = None  # Ticked by the input system rather than by Ursina, see scheduler below
+    
     def __init__(self, is_local=True, player_id=None, **kwargs):
         # Initialize FirstPersonController with movement settings
         super().__init__(
@@ -356,11 +454,19 @@ class Player(FirstPersonController):
         self.is_local = is_local
         self.player_id = player_id or str(id(self))[-4:]  # Last 4 digits of object id as player ID
         self.network_manager = None
-        self.last_network_update = 0
-        self.network_update_interval = 0.1  # Update 10 times per second
+        self.last_sent_position = None  # State in the last update we sent, to skip sending it again
+        self.last_sent_rotation = None
+        self.position_threshold = 0.01  # Smaller moves than this don't need an update
+        self.rotation_threshold = 0.5  # Degrees
         self.network_position = Vec3(0, 0, 0)
         self.network_rotation = Vec3(0, 0, 0)
         self.network_lerp_factor = 10.0  # How quickly to interpolate to network position
+        self.predictor = None  # Set for multiplayer clients, whose movement the host checks
+        self.input_send_interval = 1 / 30
+        self.last_input_send = 0
+        self.max_commands_per_send = 16  # Unacked commands resent with every input message
+        self.last_moved_sequence = 0  # Newest command that moved or turned us
+        self.last_command_yaw = None
         
         # Player state
         self.health = 100
@@ -376,7 +482,6 @@ class Player(FirstPersonController):
         self.slide_cooldown_duration = 1.5
         
         # Grapple mechanics
-{{ ... }}
         
         # Initialize grapple properties
         self.grappling = False
@@ -390,10 +495,9 @@ class Player(FirstPersonController):
         self.weapons = []
         self.current_weapon_index = 0
         
-        # Initialize weapons and UI if this is the local player
+        # Initialize weapons if this is the local player
         if self.is_local:
             self.init_weapons()
-            self.setup_ui()
         
         # Create UI elements with text labels
         # Health bar
@@ -635,7 +739,9 @@ class Player(FirstPersonController):
             self.grapple_line.end = self.grapple_point
     
     def input(self, key):
-        super().input(key)
+        # Jumping goes through the input commands when predicting
+        if not self.predictor:
+            super().input(key)
         
         # Shooting with left mouse button
         if key == 'left mouse down' and not self.grappling:
@@ -867,10 +973,13 @@ class Player(FirstPersonController):
         if self.slide_timer <= 0 or not self.grounded:
             self.end_slide()
     
-    def update(self):
+    def tick(self, dt):
         # Only process input and send updates for local player
         if self.is_local:
-            super().update()
+            if self.predictor:
+                self.update_predicted()
+            else:
+                FirstPersonController.update(self)
             
             # Update slide cooldown
             if self.slide_cooldown > 0:
@@ -887,9 +996,13 @@ class Player(FirstPersonController):
             
             # Send network updates at regular intervals
             current_time = time.time()
-            if (current_time - self.last_network_update) > self.network_update_interval:
+            if self.predictor:
+                if (current_time - self.last_input_send) > self.input_send_interval:
+                    self.send_input()
+                    self.last_input_send = current_time
+            elif self.network_manager and self.network_manager.update_due(current_time):
+                # The network manager sets the rate from how the connection is doing
                 self.send_network_update()
-                self.last_network_update = current_time
         
         # For remote players, update position/rotation based on network data
         else:
@@ -899,15 +1012,66 @@ class Player(FirstPersonController):
         wave_color = (1, 1, 0, 1)  # Yellow
         self.wave_display.color = wave_color
     
+    def enable_prediction(self):
+        """Move with the same simulation the host runs, so it can correct us"""
+        self.predictor = ClientPredictor(spawn_state())
+        state = self.predictor.state
+        self.position = (state.x, state.y, state.z)
+    
+    def update_predicted(self):
+        # Mouse look, as in FirstPersonController.update
+        self.rotation_y += mouse.velocity[0] * self.mouse_sensitivity[1]
+        self.camera_pivot.rotation_x -= mouse.velocity[1] * self.mouse_sensitivity[0]
+        self.camera_pivot.rotation_x = clamp(self.camera_pivot.rotation_x, -90, 90)
+        
+        command = make_command(
+            self.predictor.next_sequence,
+            time.dt,
+            held_keys['w'] - held_keys['s'],
+            held_keys['d'] - held_keys['a'],
+            held_keys['space'],
+            self.is_sliding,
+            self.rotation_y
+        )
+        previous = self.predictor.state
+        state = self.predictor.apply(command)
+        if state != previous or command.yaw != self.last_command_yaw:
+            self.last_moved_sequence = command.sequence
+        self.last_command_yaw = command.yaw
+        self.apply_move_state(state)
+    
+    def apply_move_state(self, state):
+        self.position = (state.x, state.y, state.z)
+        self.grounded = state.y <= 0
+    
+    def reconcile(self, sequence, state):
+        """Snap to the host's state and replay unacknowledged input if we mispredicted"""
+        corrected = self.predictor.reconcile(sequence, state)
+        if corrected:
+            self.apply_move_state(corrected)
+    
+    def send_input(self):
+        if not self.network_manager or not self.predictor.pending:
+            return
+        if self.predictor.acked_sequence >= self.last_moved_sequence:
+            return  # Standing still and the host already has where we stopped
+        self.network_manager.send_input(self.predictor.unacked_commands(self.max_commands_per_send))
+    
     def send_network_update(self):
         """Send player's current state to the network"""
         if not self.is_local or not self.network_manager:
             return
+        
+        position = tuple(self.position)
+        rotation = tuple(self.rotation)
+        if (self.last_sent_position is not None and
+                all(abs(a - b) <= self.position_threshold for a, b in zip(position, self.last_sent_position)) and
+                all(abs(a - b) <= self.rotation_threshold for a, b in zip(rotation, self.last_sent_rotation))):
+            return  # Nothing changed enough to be worth sending
+        self.last_sent_position = position
+        self.last_sent_rotation = rotation
             
-        self.network_manager.send_player_update(
-            position=tuple(self.position),
-            rotation=tuple(self.rotation)
-        )
+        self.network_manager.send_player_update(position=position, rotation=rotation)
     
     def take_damage(self, amount, attacker_id=None):
         """Handle taking damage, with optional attacker ID for multiplayer"""
@@ -939,14 +1103,12 @@ class Player(FirstPersonController):
             # For remote players, use the provided target position
             if target_pos:
                 direction = (target_pos - self.position).normalized()
-                bullet = Bullet(
+                spawn_bullet(
                     position=self.position + (0, 1.5, 0),  # Shoot from player's head
                     direction=direction,
-                    enemies_list=enemies,
                     damage=10,
                     owner_id=self.player_id
                 )
-                bullets.append(bullet)
             return
             
         # For local player, use the standard shooting logic
@@ -979,7 +1141,107 @@ class Player(FirstPersonController):
     def die(self):
         global game_over
         game_over = True
-        Text(text='GAME OVER', origin=(0,0), scale=3, background=True)
+        self.game_over_text = Text(text='GAME OVER', origin=(0,0), scale=3, background=True)
+    
+    def destroy_all(self):
+        """Destroy the player with the UI, weapons and grapple line it put outside itself"""
+        if camera.has_ancestor(self):
+            camera.parent = scene  # The camera sits under the player and must outlive it
+        weapons, self.weapons = self.weapons, []
+        destroy(self)  # First, FirstPersonController hides its cursor as it goes
+        for name in ('cursor', 'health_bar', 'health_text', 'ammo_display', 'ammo_text', 'score_display',
+                     'score_text', 'wave_display', 'wave_text', 'grapple_indicator', 'grapple_text',
+                     'grapple_line', 'game_over_text'):
+            entity = getattr(self, name, None)
+            if entity:
+                destroy(entity)
+        for weapon in weapons:
+            if isinstance(weapon.model, Entity):
+                destroy(weapon.model)  # Parented to the camera, not the weapon
+            destroy(weapon)
+
+class RemotePlayer(Entity):
+    """Another player's avatar, drawn a short delay behind the newest snapshot"""
+    def __init__(self, player_id, **kwargs):
+        super().__init__(
+            model='cube',
+            color=color.orange,
+            scale=(1, 2, 1),
+            origin_y=-0.5,  # Positions are at the player's feet
+            collider='box',
+            **kwargs
+        )
+        self.player_id = player_id
+        self.snapshot_buffer = SnapshotBuffer()
+    
+    def tick(self, dt):
+        sample = self.snapshot_buffer.sample(time.time())
+        if sample:
+            self.position, self.rotation = sample
+
+class RemoteEnemy(Entity):
+    """An enemy simulated by a dedicated server, drawn like RemotePlayer"""
+    def __init__(self, enemy_id, **kwargs):
+        is_boss = enemy_id.startswith(BOSS_PREFIX)
+        super().__init__(
+            model='sphere' if is_boss else 'cube',
+            color=(0.5, 0, 0.5, 1) if is_boss else (1, 0, 0, 1),
+            scale=(2, 3, 2) if is_boss else (1, 2, 1),
+            collider='box',
+            **kwargs
+        )
+        self.enemy_id = enemy_id
+        self.snapshot_buffer = SnapshotBuffer()
+    
+    def tick(self, dt):
+        sample = self.snapshot_buffer.sample(time.time())
+        if sample:
+            self.position, self.rotation = sample
+
+class NetStatsOverlay(Entity):
+    """Network stats under the fps counter, toggled with F3"""
+    def __init__(self, refresh_interval=0.5):
+        super().__init__(parent=camera.ui)
+        self.text = Text(
+            text='',
+            parent=camera.ui,
+            position=window.fps_counter.position + Vec3(0, -0.03, 0),
+            origin=(0.5, 0.5),
+            scale=0.75,
+            background=True
+        )
+        self.text.enabled = False
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0
+    
+    def input(self, key):
+        if key == 'f3':
+            self.text.enabled = not self.text.enabled
+    
+    def tick(self, dt):
+        if not self.text.enabled or time.time() - self.last_refresh < self.refresh_interval:
+            return
+        self.last_refresh = time.time()
+        
+        # Milliseconds per frame spent in each system
+        lines = ['  '.join(f"{name} {system['time_avg'] * 1000:.2f}" for name, system in scheduler.report().items())]
+        
+        network_manager = getattr(menu, 'network_manager', None)
+        if not network_manager:
+            lines.append('offline')
+            self.text.text = '\n'.join(lines)
+            return
+        
+        stats = network_manager.get_stats()
+        lines.append(f"{'host' if stats['is_host'] else 'client'} {stats['player_id']}  queue {stats['queue_depth']}")
+        for address, connection in stats['connections'].items():
+            rtt = f"{connection['rtt'] * 1000:.0f} ms" if connection['rtt'] is not None else '-'
+            lines.append(
+                f"{connection.get('player_id', address)}  rtt {rtt}  jitter {connection['jitter'] * 1000:.1f} ms  "
+                f"loss {connection['loss'] * 100:.0f}%  "
+                f"in {connection['bytes_in'] / 1024:.0f} KB/{connection['packets_in']}  "
+                f"out {connection['bytes_out'] / 1024:.0f} KB/{connection['packets_out']}")
+        self.text.text = '\n'.join(lines)
 
 class Enemy(Entity):
     def __init__(self, position, health=30, speed=2, damage=10, color=color.red, scale=(1, 2, 1), is_boss=False):
@@ -990,15 +1252,23 @@ class Enemy(Entity):
         self.position = position
         self.scale = scale
         
+        # Simulated position at the last two fixed steps, drawn in between
+        self.sim_position = self.position
+        self.previous_position = self.position
+        enemy_grid.insert(self, self.sim_position)
+        self.enemy_id = f'local{id(self)}'  # Its key in a listen host's lag compensation history
+        
         # Set model and color based on enemy type
         if is_boss:
             # Boss enemies are larger and purple
-            self.model = Sphere()  # Use Sphere() for bosses
+            self.model_key = ('sphere',)
+            self.model = shared_model(self.model_key, Sphere)  # Use Sphere() for bosses
             self.color = (0.5, 0, 0.5, 1)  # Purple
             self.scale = (2, 3, 2)  # Make the sphere bigger for bosses
         else:
             # Regular enemies are smaller and red
-            self.model = Cube()  # Use Cube() for regular enemies
+            self.model_key = ('cube',)
+            self.model = shared_model(self.model_key, Cube)  # Use Cube() for regular enemies
             self.color = (1, 0, 0, 1)  # Red
             
         # Set collider after model
@@ -1009,6 +1279,7 @@ class Enemy(Entity):
         self.damage = damage
         self.last_attack = 0
         self.attack_cooldown = 1.0
+        self.dead = False
         
         # Health bar
         self.health_bar = Entity(
@@ -1029,6 +1300,12 @@ class Enemy(Entity):
         b = 0.0
         self.health_bar.color = (r, g, b, 1.0)  # RGBA format
     
+    def release_model(self):
+        """Give the shared mesh back to mesh_cache, once"""
+        if self.model_key:
+            mesh_cache.release(self.model_key)
+            self.model_key = None
+    
     def take_damage(self, amount):
         self.health -= amount
         self.update_health_bar()
@@ -1039,29 +1316,40 @@ class Enemy(Entity):
         return False
     
     def die(self):
+        self.dead = True
         player.score += 10
         player.score_text.text = f'Score: {player.score}'
+        self.release_model()
+        enemy_grid.remove(self)
         destroy(self.health_bar)
         destroy(self)
     
-    def update(self):
+    def fixed_update(self, dt):
         if game_over:
             return
+        
+        # Step on from the last simulated position, not the interpolated one on screen
+        self.position = self.sim_position
             
         # Move towards player
-        direction = (player.position - self.position).normalized()
         self.look_at(player.position)
         self.rotation_x = 0
         self.rotation_z = 0
         
         # Move forward
-        self.position += self.forward * time.dt * self.speed
+        self.position += self.forward * dt * self.speed
+        self.previous_position, self.sim_position = self.sim_position, self.position
+        enemy_grid.update(self, self.sim_position)
         
         # Check for attack
         distance = (player.position - self.position).length()
-        if distance < 2 and time.time() - self.last_attack > self.attack_cooldown:
+        if distance < 2 and sim_clock.time - self.last_attack > self.attack_cooldown:
             player.take_damage(self.damage)
-            self.last_attack = time.time()
+            self.last_attack = sim_clock.time
+    
+    def interpolate(self, alpha):
+        if not self.dead:
+            self.position = lerp(self.previous_position, self.sim_position, alpha)
 
 class Boss(Enemy):
     def __init__(self, position):
@@ -1081,83 +1369,164 @@ class Boss(Enemy):
             self.look_at_2d(player.position, 'y')
         
     def die(self):
+        self.dead = True
         player.score += 100
         player.score_text.text = f'Score: {player.score}'
+        self.release_model()
+        enemy_grid.remove(self)
         destroy(self.health_bar)
         destroy(self)
 
 class Bullet(Entity):
-    def __init__(self, position, direction, enemies_list, speed=50, damage=10, bullet_color=(1, 1, 0, 1), owner_id=None):
+    """A projectile. Bullets come from bullet_pool via spawn_bullet() and go back to it in remove()."""
+    def __init__(self):
+        # The model and collider are built once and kept while the bullet sits in the pool
+        super().__init__(scale=0.2, enabled=False)
+        try:
+            # Using Sphere() with reduced segments for better performance, shared by every bullet
+            self.model = shared_model(('sphere', 8), lambda: Sphere(segments=8))
+        except:
+            self.model = 'sphere'  # Fallback to string model
+        self.collider = 'sphere'
+        self.max_lifetime = 5.0  # seconds
+        self.expired = True  # Not in use until reset()
+    
+    def reset(self, position, direction, speed=50, damage=10, bullet_color=(1, 1, 0, 1), owner_id=None):
+        """Set the bullet up for a new shot and enable it"""
         try:
-            # First create a basic entity with no model
-            super().__init__()
-            
             # Set properties directly
             self.position = position if hasattr(position, '__len__') and len(position) >= 3 else (0, 0, 0)
-            self.scale = 0.2
             self.color = bullet_color if hasattr(bullet_color, '__len__') and len(bullet_color) >= 3 else (1, 1, 0, 1)  # Default to yellow
             
-            # Add a sphere model directly
-            try:
-                self.model = Sphere(segments=8)  # Using Sphere() with reduced segments for better performance
-            except:
-                self.model = 'sphere'  # Fallback to string model
-            
-            # Set collider after model
-            self.collider = 'sphere'
-            
             # Set other properties
             self.direction = Vec3(*direction) if hasattr(direction, '__len__') and len(direction) >= 3 else Vec3(1, 0, 0)
             self.speed = max(1, min(1000, speed))  # Clamp speed to reasonable values
             self.damage = max(1, damage)  # Ensure at least 1 damage
-            self.birth_time = time.time()
-            self.max_lifetime = 5.0  # seconds
-            self.enemies_list = enemies_list if enemies_list is not None else []
+            self.birth_time = sim_clock.time
             self.owner_id = owner_id  # ID of the player who shot this bullet
             self.has_collided = False  # Track if bullet has already hit something
+            self.expired = False  # Released to the pool, drop it from the bullets list
+            self.sim_position = self.position
+            self.previous_position = self.position
             
             # Make the bullet face the direction it's moving
             self.look_at(self.position + self.direction)
             
-            # Play shoot sound for local player's bullets
-            if owner_id == getattr(player, 'player_id', None):
-                try:
-                    Audio('assets/sounds/shoot.wav', autoplay=False, volume=0.3).play()
-                except:
-                    pass
             self.enabled = True  # Enable the bullet
         
-        except Exception as e:
-            print(f"Error initializing bullet: {e}")
-            self.enabled = False  # Disable if there's an error
+        except Exception:
+            self.enabled = False
+            raise  # bullet_pool.acquire() puts it back in the pool
     
-    def update(self):
+    def fixed_update(self, dt):
         try:
             if not hasattr(self, 'enabled') or not self.enabled:
-                destroy(self)
+                self.remove()
                 return
                 
             # Move the bullet
-            if hasattr(self, 'position') and hasattr(self, 'direction') and hasattr(self, 'speed'):
-                self.position += self.direction * self.speed * time.dt
+            if hasattr(self, 'sim_position') and hasattr(self, 'direction') and hasattr(self, 'speed'):
+                self.previous_position = self.sim_position
+                self.sim_position = self.sim_position + self.direction * self.speed * dt
+                self.position = self.sim_position
             
             # Check if bullet has been alive too long
-            if time.time() - self.birth_time > self.max_lifetime:
-                destroy(self)
+            if sim_clock.time - self.birth_time > self.max_lifetime:
+                self.remove()
                 return
                 
-            # Check for collisions with enemies
-            if hasattr(self, 'enemies_list') and self.enemies_list is not None:
-                for enemy in list(self.enemies_list):  # Create a copy of the list to avoid modification during iteration
-                    if enemy and hasattr(enemy, 'enabled') and enemy.enabled and distance(enemy, self) < 1.5:
-                        if hasattr(enemy, 'take_damage'):
-                            enemy.take_damage(self.damage)
-                        destroy(self)
-                        return
+            # Check the whole path of this step against enemies and the level, so a fast
+            # bullet can't skip past an enemy between steps; the earliest hit wins
+            # Only enemies in the grid cells around the path are candidates
+            targets = ((enemy, enemy.sim_position, HIT_RADIUS)
+                       for enemy in enemy_grid.query_segment(self.previous_position, self.sim_position, HIT_RADIUS)
+                       if not enemy.dead and enemy.enabled)
+            hit = level_collision.sweep(self.previous_position, self.sim_position, targets)
+            if hit:
+                enemy = hit[1]
+                if hasattr(enemy, 'take_damage'):
+                    enemy.take_damage(self.damage)
+                self.remove()
+                return
                         
         except Exception as e:
             print(f"Error in bullet update: {e}")
-            destroy(self)
+            self.remove()
+    
+    def interpolate(self, alpha):
+        if not self.expired and self.enabled:
+            self.position = lerp(self.previous_position, self.sim_position, alpha)
+    
+    def remove(self):
+        self.expired = True
+        self.enabled = False
+        bullet_pool.release(self)
+
+bullet_pool = ObjectPool(Bullet, max_size=512)
+
+class ProjectileRenderer(Entity):
+    """Draws every projectile in projectile_system as one point cloud node"""
+    def __init__(self, system, point_size=0.2):
+        super().__init__()
+        self.system = system
+        
+        # Positions and colors in separate arrays so each can be copied straight from NumPy
+        vertex_format = GeomVertexFormat()
+        vertex_format.add_array(GeomVertexArrayFormat('vertex', 3, Geom.NT_float32, Geom.C_point))
+        vertex_format.add_array(GeomVertexArrayFormat('color', 4, Geom.NT_float32, Geom.C_color))
+        self.vertex_data = GeomVertexData('projectiles', GeomVertexFormat.register_format(vertex_format),
+                                          Geom.UH_stream)
+        self.points = GeomPoints(Geom.UH_stream)
+        geom = Geom(self.vertex_data)
+        geom.add_primitive(self.points)
+        geom_node = GeomNode('projectiles')
+        geom_node.add_geom(geom)
+        geom_node.set_bounds(OmniBoundingVolume())  # Points move every frame, don't cull on stale bounds
+        geom_node.set_final(True)
+        self.node = self.attach_new_node(geom_node)
+        self.node.set_render_mode_thickness(point_size)
+        self.node.set_render_mode_perspective(True)  # point_size is in world units, the bullet spheres' scale
+        self.node.set_light_off()
+    
+    def draw(self, alpha):
+        count = self.system.count
+        self.vertex_data.unclean_set_num_rows(count)
+        if count:
+            positions = self.system.interpolated_positions(alpha)
+            memoryview(self.vertex_data.modify_array(0)).cast('B')[:] = positions.tobytes()
+            memoryview(self.vertex_data.modify_array(1)).cast('B')[:] = self.system.color[:count].tobytes()
+        self.points.clear_vertices()
+        if count:
+            self.points.add_consecutive_vertices(0, count)
+
+if USE_PROJECTILE_SYSTEM:
+    projectile_system = ProjectileSystem()
+    projectile_renderer = ProjectileRenderer(projectile_system)
+else:
+    projectile_system = projectile_renderer = None
+
+def spawn_bullet(position, direction, speed=50, damage=10, bullet_color=(1, 1, 0, 1), owner_id=None):
+    """Start a bullet flying, in projectile_system or as a pooled Bullet entity.
+    
+    Returns False if the projectile system or the pool is at its cap.
+    """
+    # Play shoot sound for local player's bullets
+    if owner_id == getattr(player, 'player_id', None):
+        try:
+            Audio('assets/sounds/shoot.wav', autoplay=False, volume=0.3).play()
+        except:
+            pass
+    
+    if projectile_system:
+        row = projectile_system.spawn(position, direction, max(1, min(1000, speed)), max(1, damage),
+                                      owner_id, sim_clock.time, color=bullet_color)
+        return row is not None
+    
+    bullet = bullet_pool.acquire(position=position, direction=direction, speed=speed, damage=damage,
+                                 bullet_color=bullet_color, owner_id=owner_id)
+    if bullet:
+        bullets.append(bullet)
+    return bullet is not None
 
 class Powerup(Entity):
     def __init__(self, position, powerup_type):
@@ -1169,7 +1538,8 @@ class Powerup(Entity):
         self.scale = 0.5
         
         # Set model and color based on powerup type
-        self.model = Cube()  # Using Cube() for better compatibility
+        self.model_key = ('cube',)
+        self.model = shared_model(self.model_key, Cube)  # Using Cube() for better compatibility
         
         if powerup_type == 'health':
             self.color = (0, 1, 0, 1)  # Green
@@ -1183,6 +1553,12 @@ class Powerup(Entity):
         self.animate_rotation((0, 360, 0), duration=3, loop=True)
         self.animate_y(self.y + 0.5, duration=1, loop=True, curve=curve.in_out_sine)
     
+    def release_model(self):
+        """Give the shared mesh back to mesh_cache, once"""
+        if self.model_key:
+            mesh_cache.release(self.model_key)
+            self.model_key = None
+    
     def collect(self):
         if self.powerup_type == 'health':
             player.health = min(player.max_health, player.health + 25)
@@ -1192,6 +1568,7 @@ class Powerup(Entity):
                 weapon.ammo = weapon.max_ammo
             player.update_ammo_display()
         
+        self.release_model()
         destroy(self)
 
 def spawn_enemy(is_boss=False):
@@ -1271,19 +1648,13 @@ def shoot():
                     globals()['enemies'] = []
                 
                 # Create bullet
-                bullet = Bullet(
+                spawn_bullet(
                     position=camera.world_position,
                     direction=camera.forward,
-                    enemies_list=enemies,
                     damage=weapon.damage,
                     bullet_color=weapon.model_color if hasattr(weapon, 'model_color') else color.yellow
                 )
                 
-                # Ensure bullets list exists
-                if 'bullets' not in globals():
-                    globals()['bullets'] = []
-                bullets.append(bullet)
-                
                 # Update ammo display
                 if hasattr(player, 'update_ammo_display'):
                     player.update_ammo_display()
@@ -1312,8 +1683,25 @@ def reload_weapon():
         # Play reload sound (if available)
         # play_sound('reload.wav')
 
+def build_level():
+    """Floor and walls as one combined mesh with one collider holding a box per piece"""
+    level = Entity(texture='white_cube')
+    Entity(parent=level, model='cube', position=FLOOR[0], scale=FLOOR[1], texture='white_cube', texture_scale=(10, 10))
+    for pos, size in WALLS:
+        Entity(parent=level, model='cube', position=pos, scale=size, color=color.gray, texture='white_cube')
+    level.combine()  # Bakes the pieces into the level's mesh and destroys them
+    
+    boxes = [CollisionBox(Vec3(*center), *(extent / 2 for extent in size)) for center, size in [FLOOR] + WALLS]
+    level.collider = Collider(level, boxes)
+    
+    # Bullets stop at the floor and walls
+    level_collision.clear_statics()
+    for center, size in [FLOOR] + WALLS:
+        level_collision.add_static(*box_from_center(center, size), tag='level')
+    return level
+
 def start_game():
-    global player, ground, enemies, bullets, powerups, wave, enemies_per_wave, game_over, score
+    global player, level, enemies, bullets, powerups, wave, enemies_per_wave, game_over, score, sim_clock
     
     # Get reference to the menu
     menu = None
@@ -1327,99 +1715,150 @@ def start_game():
     score = 0
     wave = 1
     enemies_per_wave = 5
+    sim_clock = FixedTimestep()
+    scheduler.timestep = sim_clock
     
-    # Clear existing entities
+    # Destroy the last game's entities, so restarting doesn't pile up entities and colliders
+    if player:
+        player.destroy_all()
+        player = None
     for enemy in enemies[:]:
         if enemy and hasattr(enemy, 'enabled'):
-            enemy.disable()
+            enemy.release_model()
+            destroy(enemy)
     enemies.clear()
+    enemy_grid.clear()
     
+    # Bullets go back to the pool rather than being left disabled in the scene
     for bullet in bullets[:]:
-        if bullet and hasattr(bullet, 'enabled'):
-            bullet.disable()
+        bullet.remove()
     bullets.clear()
+    if projectile_system:
+        projectile_system.clear()
+    else:
+        bullet_pool.prewarm(64)
     
     for powerup in powerups[:]:
         if powerup and hasattr(powerup, 'enabled'):
-            powerup.disable()
+            powerup.release_model()
+            destroy(powerup)
     powerups.clear()
     
-    # Create ground
-    ground = Entity(
-        model='plane',
-        scale=100,
-        texture='white_cube',
-        texture_scale=(10, 10),
-        collider='box'
-    )
-    
-    # Create walls
-    wall_positions = [
-        (0, 5, -50), (0, 5, 50),  # Front and back walls
-        (-50, 5, 0), (50, 5, 0),   # Left and right walls
-    ]
+    # The level never changes, so it's only built on the first run
+    if level is None:
+        level = build_level()
     
-    for pos in wall_positions:
-        wall = Entity(
-            model='cube',
-            scale=(100, 10, 1) if abs(pos[2]) > 0 else (1, 10, 100),
-            position=pos,
-            color=color.gray,
-            collider='box',
-            texture='white_cube'
-        )
-    
-    # Create player
-    is_multiplayer = hasattr(menu, 'is_multiplayer') and menu.is_multiplayer
+    # Create player. Online it goes by the network manager's id, which is what the host
+    # and other players know it as and address damage to
+    network_manager = getattr(menu, 'network_manager', None) if getattr(menu, 'is_multiplayer', False) else None
+    if network_manager:
+        player_id = network_manager.player_id
+    else:
+        player_id = menu.player_id if hasattr(menu, 'player_id') else None
     player = Player(
         position=(0, 2, 0),
         is_local=True,  # The local player is always controlled by this client
-        player_id=menu.player_id if hasattr(menu, 'player_id') else None
+        player_id=player_id
     )
     
     # Set up network manager if in multiplayer
-    if is_multiplayer and hasattr(menu, 'network_manager') and menu.network_manager:
-        player.network_manager = menu.network_manager
+    if network_manager:
+        player.network_manager = network_manager
     
     camera.parent = player
     
     # Only spawn enemies for single-player or host
-    if not is_multiplayer or (hasattr(menu, 'network_manager') and menu.network_manager and menu.network_manager.is_host):
+    if not network_manager or network_manager.is_host:
         spawn_wave()
     
 
-def update():
-    # This function is called every frame
-    if game_over or not hasattr(player, 'enabled') or not player.enabled:
+def playing():
+    return not game_over and hasattr(player, 'enabled') and player.enabled
+
+# Systems, run in this order once per frame by update(). Entities they tick don't
+# define update(), so Ursina doesn't update them a second time.
+def input_system(dt):
+    global game_over
+    if not playing():
+        return
+    if player.health <= 0:
+        game_over = True
+        return
+    player.tick(dt)
+
+def network_system(dt):
+    # NetworkManager isn't an Entity, so nothing else updates it
+    if menu.network_manager:
+        if menu.network_manager.is_host:
+            # Our enemies aren't in the snapshots, but shots from clients are checked against them
+            menu.network_manager.rewind_positions = {
+                enemy.enemy_id: tuple(enemy.sim_position) for enemy in enemies if not enemy.dead}
+        menu.network_manager.update()
+    for remote in list(menu.remote_players.values()) + list(menu.remote_enemies.values()):
+        remote.tick(dt)
+
+def ai_system(dt):
+    """One fixed step of the locally simulated enemies"""
+    if not playing():
         return
+    for enemy in enemies[:]:
+        enemy.fixed_update(dt)
+    enemies[:] = [enemy for enemy in enemies if not enemy.dead]
+
+def projectile_system_step(dt):
+    """One fixed step of the bullets, after the enemies have moved"""
+    if not playing():
+        return
+    for bullet in bullets[:]:
+        bullet.fixed_update(dt)
+    if projectile_system and projectile_system.count:
+        live = [enemy for enemy in projectile_system.nearby(enemy_grid, dt) if not enemy.dead and enemy.enabled]
+        targets = [tuple(enemy.sim_position) for enemy in live]
+        for target, damage, owner_id in projectile_system.step(dt, sim_clock.time, targets, level_collision.statics):
+            if not live[target].dead:
+                live[target].take_damage(damage)
     
-    try:
-        # Update player
-        if player.health <= 0:
-            global game_over
-            game_over = True
-            return
-            
-        # Update bullets
-        for bullet in bullets[:]:
-            if bullet and hasattr(bullet, 'update'):
-                bullet.update()
-                
-        # Update enemies
-        for enemy in enemies[:]:
-            if enemy and hasattr(enemy, 'update'):
-                enemy.update()
-                
-        # Update powerups
-        for powerup in powerups[:]:
-            if powerup and hasattr(powerup, 'update'):
-                powerup.update()
-                
-    except Exception as e:
-        print(f"Error in update: {e}")
+    # Drop whatever was destroyed this step
+    bullets[:] = [bullet for bullet in bullets if not bullet.expired]
+    enemies[:] = [enemy for enemy in enemies if not enemy.dead]
+
+def interpolation_system(dt):
+    """Draw bullets and enemies between their last two simulated positions"""
+    alpha = sim_clock.alpha
+    for bullet in bullets:
+        bullet.interpolate(alpha)
+    if projectile_renderer:
+        projectile_renderer.draw(alpha)
+    for enemy in enemies:
+        enemy.interpolate(alpha)
+
+def pickup_system(dt):
+    if not playing():
+        return
+    for powerup in powerups[:]:
+        if distance(powerup.position, player.position) < 1.5:
+            powerup.collect()
+            powerups.remove(powerup)
+
+def ui_system(dt):
+    net_stats_overlay.tick(dt)
+
+scheduler = Scheduler(sim_clock)
+scheduler.add('input', input_system)
+scheduler.add('network', network_system)
+scheduler.add('ai', ai_system, fixed=True)  # Bullets and enemies step at a fixed rate however fast frames come
+scheduler.add('projectiles', projectile_system_step, fixed=True)
+scheduler.add('interpolation', interpolation_system)
+scheduler.add('pickups', pickup_system)
+scheduler.add('ui', ui_system)
+
+def update():
+    # Ursina calls this once per frame
+    scheduler.run(time.dt)
 
 # Create start menu
 menu = StartMenu()
+net_stats_overlay = NetStatsOverlay()
 
 # Start the game
 if __name__ == '__main__':
@@ -1436,8 +1875,8 @@ if __name__ == '__main__':
                 print(f"Error in game loop: {e}")
                 # Try to keep the game running
                 try:
-                    if 'player' in globals() and player and hasattr(player, 'update'):
-                        player.update()
+                    if 'player' in globals() and player and hasattr(player, 'tick'):
+                        player.tick(time.dt)
                 except Exception as e:
                     print(f"Error in player update: {e}")
         
@@ -0,0 +1,381 @@
+"""Match server: many rooms behind one UDP port, each in its own process.
+
+A dispatcher owns the public socket. Clients send a join message with a
+room id before connecting (NetworkManager does this when given a room_id),
+and from then on every datagram from that address is passed to the room's
+worker process through a pipe. Each worker runs a DedicatedServer whose
+NetworkManager uses a PipeTransport instead of a socket, and the packets
+it sends go back through the pipe and out of the dispatcher's socket.
+Rooms are created when someone joins an id that doesn't exist yet (on a
+separate thread, since spawning a worker takes a while and the socket
+thread must keep reading), closed
+when nobody has sent them anything for idle_timeout seconds, and report
+their tick time and CPU use to the dispatcher every second:
+
+    python matchserver.py --port 5555 --rooms 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+import protocol
+from transport import UDPTransport
+
+FRAME = struct.Struct('!B4sH')  # kind, client IPv4 address, client port
+DATAGRAM = 0
+CONTROL = 1  # JSON body: {'type': 'stop'} to a worker, {'type': 'stats', ...} from one
+NO_ADDRESS = (b'\0\0\0\0', 0)
+JOIN_TYPE = protocol.MESSAGE_TYPES['join']
+# Workers start from a fresh interpreter rather than a fork of the dispatcher and its socket thread
+SPAWN = multiprocessing.get_context('spawn')
+
+
+def pack_frame(kind, addr, data):
+    ip, port = (socket.inet_aton(addr[0]), addr[1]) if addr else NO_ADDRESS
+    return FRAME.pack(kind, ip, port) + data
+
+
+def unpack_frame(frame):
+    kind, ip, port = FRAME.unpack_from(frame)
+    return kind, (socket.inet_ntoa(ip), port), memoryview(frame)[FRAME.size:]
+
+
+class PipeTransport:
+    """Stands in for UDPTransport inside a room worker: datagrams come and go through a pipe."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.on_datagrams = None
+        self.on_control = None  # Called with each control message from the dispatcher
+        self.address = ('pipe', 0)
+        self.stats = {
+            'wakeups': 0,
+            'datagrams': 0,
+            'max_batch': 0
+        }
+
+    def start(self, on_datagrams):
+        self.on_datagrams = on_datagrams
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def sendto(self, data, addr):
+        try:
+            with self.send_lock:
+                self.conn.send_bytes(pack_frame(DATAGRAM, addr, data))
+            return len(data)
+        except (OSError, ValueError):
+            return 0  # Dispatcher gone
+
+    def send_control(self, message):
+        with self.send_lock:
+            self.conn.send_bytes(pack_frame(CONTROL, None, json.dumps(message).encode()))
+
+    def close(self):
+        self.running = False
+        self.conn.close()
+
+    def _run(self):
+        while self.running:
+            try:
+                batch = [self.conn.recv_bytes()]
+                # Hand over everything already waiting in one go, like UDPTransport's drain
+                while self.conn.poll(0) and len(batch) < 64:
+                    batch.append(self.conn.recv_bytes())
+            except (EOFError, OSError):
+                if self.running and self.on_control:
+                    self.on_control({'type': 'stop'})  # The dispatcher went away
+                return
+
+            datagrams = []
+            for frame in batch:
+                kind, addr, body = unpack_frame(frame)
+                if kind == DATAGRAM:
+                    datagrams.append((body, addr))
+                elif self.on_control:
+                    self.on_control(json.loads(bytes(body).decode()))
+            if datagrams:
+                self.stats['wakeups'] += 1
+                self.stats['datagrams'] += len(datagrams)
+                self.stats['max_batch'] = max(self.stats['max_batch'], len(datagrams))
+                self.on_datagrams(datagrams)
+
+
+def run_room(room_id, conn, tick_rate, seed):
+    """Worker process entry point."""
+    # Imported here so the dispatcher process doesn't load the simulation
+    from server import DedicatedServer
+
+    class RoomServer(DedicatedServer):
+        def report(self):
+            self.network.transport.send_control({
+                'type': 'stats',
+                'cpu_time': time.process_time(),
+                'players': len(self.network.clients),
+                'enemies': len(self.world.enemies),
+                'wave': self.world.wave - 1,
+                'ticks': self.stats['ticks'],
+                'tick_time_avg': self.stats['tick_time_avg'],
+                'tick_time_max': self.stats['tick_time_max'],
+                'overruns': self.stats['overruns']
+            })
+
+    transport = PipeTransport(conn)
+    server = RoomServer(tick_rate=tick_rate, seed=seed, transport=transport)
+    server.report_interval = 1.0
+
+    def on_control(message):
+        if message.get('type') == 'stop':
+            server.running = False
+    transport.on_control = on_control
+
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+
+
+class Room:
+    def __init__(self, room_id, process, conn):
+        self.room_id = room_id
+        self.process = process
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.created = time.time()
+        self.last_active = time.time()  # Last datagram from a client
+        self.stats = {}  # Latest report from the worker, plus cpu_percent
+        self.last_cpu = None  # (wall time, cpu time) at the previous report
+        self.reader = None
+
+    def send(self, kind, addr, data):
+        try:
+            with self.send_lock:
+                self.conn.send_bytes(pack_frame(kind, addr, data))
+        except (OSError, ValueError):
+            pass  # Worker gone, cleaned up by check_rooms
+
+    def update_stats(self, report):
+        now = time.time()
+        if self.last_cpu is not None:
+            wall, cpu = self.last_cpu
+            report['cpu_percent'] = (report['cpu_time'] - cpu) / (now - wall) * 100 if now > wall else 0.0
+        self.last_cpu = (now, report['cpu_time'])
+        self.stats = report
+
+
+class MatchServer:
+    def __init__(self, host='0.0.0.0', port=5555, tick_rate=30, max_rooms=None, idle_timeout=60.0,
+                 auto_create=True):
+        self.tick_rate = tick_rate
+        self.max_rooms = max_rooms or os.cpu_count() or 1
+        self.idle_timeout = idle_timeout
+        self.auto_create = auto_create  # Open a room when a client asks to join one that doesn't exist
+        self.transport = UDPTransport((host, port))
+        self.rooms = {}  # room id -> Room
+        self.routes = {}  # client addr -> room id
+        self.lock = threading.Lock()  # rooms and routes are used from the socket thread too
+        self.opening = set()  # Room ids queued for the opener thread
+        self.open_queue = queue.Queue()
+        self.opener = None
+        self.running = False
+        self.stats = {
+            'forwarded': 0,  # Datagrams from clients passed to a room
+            'returned': 0,  # Datagrams from rooms sent to clients
+            'unrouted': 0,  # Datagrams from addresses that haven't joined a room
+            'rejected_joins': 0
+        }
+
+    @property
+    def address(self):
+        return self.transport.address
+
+    def start(self):
+        self.running = True
+        self.opener = threading.Thread(target=self._open_rooms, daemon=True)
+        self.opener.start()
+        self.transport.start(self._on_datagrams)
+        print(f"Match server listening on {self.address[0]}:{self.address[1]}, up to {self.max_rooms} rooms")
+
+    def create_room(self, room_id=None):
+        """Start a worker process for a room. Returns its id, or None if the server is full."""
+        with self.lock:
+            if room_id in self.rooms:
+                return room_id
+            if len(self.rooms) >= self.max_rooms:
+                return None
+            if room_id is None:
+                room_id = max(self.rooms, default=0) + 1
+
+            dispatcher_conn, worker_conn = SPAWN.Pipe()
+            process = SPAWN.Process(
+                target=run_room, args=(room_id, worker_conn, self.tick_rate, None),
+                name=f"room-{room_id}", daemon=True)
+            process.start()
+            worker_conn.close()  # Only the worker uses this end now
+
+            room = Room(room_id, process, dispatcher_conn)
+            room.reader = threading.Thread(target=self._read_room, args=(room,), daemon=True)
+            room.reader.start()
+            self.rooms[room_id] = room
+        print(f"Room {room_id} opened (pid {process.pid})")
+        return room_id
+
+    def close_room(self, room_id):
+        with self.lock:
+            room = self.rooms.pop(room_id, None)
+            for addr in [addr for addr, routed in self.routes.items() if routed == room_id]:
+                del self.routes[addr]
+        if room is None:
+            return
+        room.send(CONTROL, None, json.dumps({'type': 'stop'}).encode())
+        room.process.join(timeout=2)
+        if room.process.is_alive():
+            room.process.terminate()
+        room.conn.close()
+        print(f"Room {room_id} closed")
+
+    def room_stats(self):
+        """Latest stats reported by each room, with its player count and CPU use."""
+        with self.lock:
+            rooms = list(self.rooms.values())
+        return {
+            room.room_id: dict(room.stats, alive=room.process.is_alive(),
+                               clients=sum(1 for routed in list(self.routes.values()) if routed == room.room_id))
+            for room in rooms
+        }
+
+    def check_rooms(self, now):
+        """Close rooms whose worker died or that nobody has used for idle_timeout seconds."""
+        with self.lock:
+            rooms = list(self.rooms.values())
+        for room in rooms:
+            if not room.process.is_alive():
+                print(f"Room {room.room_id} worker exited with code {room.process.exitcode}")
+                self.close_room(room.room_id)
+            elif self.idle_timeout and now - room.last_active > self.idle_timeout:
+                self.close_room(room.room_id)
+
+    def _on_datagrams(self, datagrams):
+        # Runs on the socket thread
+        for data, addr in datagrams:
+            if len(data) >= protocol.HEADER.size and data[0] == protocol.PROTOCOL_MAGIC and data[2] == JOIN_TYPE:
+                self._handle_join(data, addr)
+                continue
+            with self.lock:
+                room = self.rooms.get(self.routes.get(addr))
+            if room is None:
+                self.stats['unrouted'] += 1
+                continue
+            room.last_active = time.time()
+            room.send(DATAGRAM, addr, data)
+            self.stats['forwarded'] += 1
+
+    def _handle_join(self, data, addr):
+        try:
+            room_id = protocol.decode(data)['room']
+        except protocol.ProtocolError as e:
+            print(f"Dropped bad join from {addr}: {e}")
+            return
+        with self.lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                if not self.auto_create:
+                    self.stats['rejected_joins'] += 1
+                    return
+                if room_id not in self.opening:
+                    self.opening.add(room_id)
+                    self.open_queue.put(room_id)
+            # Until the room is open this address's datagrams count as unrouted; the
+            # client repeats its join and connect until the room answers
+            self.routes[addr] = room_id
+        if room:
+            room.last_active = time.time()
+
+    def _open_rooms(self):
+        # Runs on the opener thread, so spawning a worker never holds up the socket thread
+        while True:
+            room_id = self.open_queue.get()
+            if room_id is None:
+                return
+            opened = self.create_room(room_id) is not None
+            with self.lock:
+                self.opening.discard(room_id)
+                if not opened:
+                    for addr in [addr for addr, routed in self.routes.items() if routed == room_id]:
+                        del self.routes[addr]
+                        self.stats['rejected_joins'] += 1
+
+    def _read_room(self, room):
+        while True:
+            try:
+                frame = room.conn.recv_bytes()
+            except (EOFError, OSError):
+                return
+            kind, addr, body = unpack_frame(frame)
+            if kind == DATAGRAM:
+                self.transport.sendto(body, addr)
+                self.stats['returned'] += 1
+            else:
+                message = json.loads(bytes(body).decode())
+                if message.get('type') == 'stats':
+                    room.update_stats(message)
+
+    def run(self, report_interval=10.0):
+        self.start()
+        last_report = time.time()
+        try:
+            while self.running:
+                time.sleep(0.5)
+                now = time.time()
+                self.check_rooms(now)
+                if now - last_report > report_interval:
+                    last_report = now
+                    for room_id, stats in self.room_stats().items():
+                        print(f"Room {room_id}: {stats.get('players', 0)} players, "
+                              f"tick {stats.get('tick_time_avg', 0) * 1000:.2f} ms avg, "
+                              f"cpu {stats.get('cpu_percent', 0):.0f}%")
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.running = False
+        self.open_queue.put(None)
+        if self.opener:
+            self.opener.join(timeout=5)
+        for room_id in list(self.rooms):
+            self.close_room(room_id)
+        self.transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run many rooms behind one port, one process per room')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to bind to')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--tick-rate', type=int, default=30)
+    parser.add_argument('--rooms', type=int, default=0, help='Rooms to open at start, numbered from 1')
+    parser.add_argument('--max-rooms', type=int, default=None, help='Defaults to the number of CPU cores')
+    parser.add_argument('--idle-timeout', type=float, default=60, help='Close rooms unused for this many seconds')
+    args = parser.parse_args()
+
+    server = MatchServer(host=args.host, port=args.port, tick_rate=args.tick_rate, max_rooms=args.max_rooms,
+                         idle_timeout=args.idle_timeout)
+    for room_id in range(1, args.rooms + 1):
+        server.create_room(room_id)
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        print("Match server stopped")
+
+
+if __name__ == '__main__':
+    main()
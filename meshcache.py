@@ -0,0 +1,64 @@
+"""Shared cache of generated meshes and loaded models.
+
+Procedural primitives like Sphere(segments=8) build their vertex data every
+time they are constructed. The cache builds each one once per key and hands
+out the same object to everyone who asks for that key, counting references.
+When the last user releases a key, the mesh is kept as unused in case it's
+needed again; only the least recently used unused meshes beyond max_unused
+are evicted, and on_evict is called on them so they can be freed.
+
+It doesn't depend on Ursina. main.py gives each entity its own copy of the
+cached node, which shares the cached vertex data rather than generating it.
+"""
+from collections import OrderedDict
+
+
+class MeshCache:
+    def __init__(self, max_unused=16, on_evict=None):
+        self.max_unused = max_unused
+        self.on_evict = on_evict
+        self.meshes = {}  # key -> mesh
+        self.refs = {}  # key -> reference count, only for keys in use
+        self.unused = OrderedDict()  # keys with no references, least recently released first
+        self.stats = {
+            'hits': 0,
+            'misses': 0,  # Meshes built by a factory
+            'evictions': 0
+        }
+
+    def acquire(self, key, factory):
+        """The mesh for key, built with factory() the first time. Pair every call with release(key)."""
+        mesh = self.meshes.get(key)
+        if mesh is None:
+            mesh = self.meshes[key] = factory()
+            self.stats['misses'] += 1
+        else:
+            self.stats['hits'] += 1
+        self.unused.pop(key, None)
+        self.refs[key] = self.refs.get(key, 0) + 1
+        return mesh
+
+    def release(self, key):
+        count = self.refs.get(key)
+        if count is None:
+            return
+        if count > 1:
+            self.refs[key] = count - 1
+            return
+        del self.refs[key]
+        self.unused[key] = True
+        while len(self.unused) > self.max_unused:
+            self.evict(next(iter(self.unused)))
+
+    def evict(self, key):
+        """Drop an unused mesh. Meshes still referenced are left alone."""
+        if key in self.refs or key not in self.meshes:
+            return
+        self.unused.pop(key, None)
+        mesh = self.meshes.pop(key)
+        self.stats['evictions'] += 1
+        if self.on_evict:
+            self.on_evict(mesh)
+
+    def report(self):
+        return dict(self.stats, meshes=len(self.meshes), in_use=len(self.refs), unused=len(self.unused))
@@ -0,0 +1,74 @@
+"""Deterministic player movement.
+
+The same simulate_move runs on the client to predict its own player and on
+the host to decide where that player really is, so both must be fed exactly
+the same commands. make_command rounds every float to what survives the
+wire for that reason.
+"""
+import math
+import struct
+from collections import namedtuple
+
+PLAYER_SPEED = 7
+SLIDE_SPEED = 15
+JUMP_HEIGHT = 2
+GRAVITY = 25.0  # Units per second squared
+ARENA_LIMIT = 49.0  # Walls are at +-50, keep the player's body inside them
+SPAWN_POSITION = (0.0, 2.0, 0.0)
+MAX_COMMAND_DT = 0.1  # Longer frames are clamped so a stalled client can't teleport
+
+InputCommand = namedtuple('InputCommand', 'sequence dt forward right jump slide yaw')
+MoveState = namedtuple('MoveState', 'x y z y_velocity')
+
+_FLOAT = struct.Struct('!f')
+
+
+def _wire_float(value):
+    return _FLOAT.unpack(_FLOAT.pack(value))[0]
+
+
+def make_command(sequence, dt, forward, right, jump, slide, yaw):
+    """Build a command with the same precision it will have after being sent."""
+    return InputCommand(
+        sequence,
+        _wire_float(dt),
+        max(-1, min(1, int(forward))),
+        max(-1, min(1, int(right))),
+        bool(jump),
+        bool(slide),
+        _wire_float(yaw % 360)
+    )
+
+
+def spawn_state():
+    return MoveState(*SPAWN_POSITION, 0.0)
+
+
+def simulate_move(state, command):
+    """Advance a MoveState by one InputCommand."""
+    dt = min(max(command.dt, 0.0), MAX_COMMAND_DT)
+    x, y, z, y_velocity = state
+
+    # Same direction as FirstPersonController: forward/right relative to yaw, normalized
+    yaw = math.radians(command.yaw)
+    dx = math.sin(yaw) * command.forward + math.cos(yaw) * command.right
+    dz = math.cos(yaw) * command.forward - math.sin(yaw) * command.right
+    length = math.hypot(dx, dz)
+    if length > 0:
+        speed = SLIDE_SPEED if command.slide else PLAYER_SPEED
+        x += dx / length * speed * dt
+        z += dz / length * speed * dt
+    x = max(-ARENA_LIMIT, min(ARENA_LIMIT, x))
+    z = max(-ARENA_LIMIT, min(ARENA_LIMIT, z))
+
+    grounded = y <= 0 and y_velocity <= 0
+    if grounded and command.jump:
+        y_velocity = math.sqrt(2 * GRAVITY * JUMP_HEIGHT)
+    elif not grounded:
+        y_velocity -= GRAVITY * dt
+    y += y_velocity * dt
+    if y <= 0:
+        y = 0.0
+        y_velocity = 0.0
+
+    return MoveState(x, y, z, y_velocity)
@@ -67,11 +67,19 @@ class MultiplayerMenu(Entity):
             parent=self.join_menu
         )
         
+        self.room_input = InputField(
+            default_value='',
+            label='Room (match servers only):',
+            scale=(0.2, 0.05),
+            y=-0.08,
+            parent=self.join_menu
+        )
+        
         self.connect_button = Button(
             text='CONNECT',
             color=color.green,
             scale=(0.2, 0.08),
-            y=-0.15,
+            y=-0.18,
             parent=self.join_menu
         )
         self.connect_button.on_click = self.join_game
@@ -142,15 +150,16 @@ class MultiplayerMenu(Entity):
         host = self.ip_input.text
         try:
             port = int(self.port_input.text)
+            room_id = int(self.room_input.text) if self.room_input.text.strip() else None
             self.status_text.text = f"Connecting to {host}:{port}..."
             self.status_text.color = color.yellow
             
             # Start the game in client mode
             if hasattr(self.parent, 'start_multiplayer'):
-                self.parent.start_multiplayer(is_host=False, host=host, port=port)
+                self.parent.start_multiplayer(is_host=False, host=host, port=port, room_id=room_id)
             
         except ValueError:
-            self.status_text.text = "Invalid port number"
+            self.status_text.text = "Invalid port or room number"
             self.status_text.color = color.red
     
     def start_hosting(self):
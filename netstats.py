@@ -0,0 +1,146 @@
+"""Per-connection network statistics.
+
+NetworkManager feeds every datagram it sends and receives into a NetStats,
+which keeps packet and byte counters per peer and per message type, round
+trip time and jitter from ping/pong, and packet loss from pings that never
+came back. report() returns all of it as a plain dict, and with dump_path
+set the report is appended to a JSON lines file every dump_interval seconds.
+"""
+import json
+import time
+
+import protocol
+
+PING_TIMEOUT = 2.0  # A ping with no pong after this long counts as lost
+
+
+class ConnectionStats:
+    def __init__(self):
+        self.packets_in = 0
+        self.packets_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in = {}  # message type -> [count, bytes]
+        self.messages_out = {}
+        self.rtt = None  # Seconds, smoothed
+        self.rtt_min = None
+        self.jitter = 0.0  # Smoothed change between consecutive RTT samples (RFC 3550 style)
+        self.last_rtt = None
+        self.pings_sent = 0
+        self.pings_lost = 0
+        self.pongs_received = 0
+        self.outstanding_pings = set()  # Send times of pings still waiting for a pong
+
+    def add_rtt(self, rtt):
+        if self.rtt is None:
+            self.rtt = rtt
+        else:
+            self.rtt += (rtt - self.rtt) * 0.125
+            self.jitter += (abs(rtt - self.last_rtt) - self.jitter) / 16
+        self.last_rtt = rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+
+    @property
+    def loss(self):
+        """Fraction of pings that were lost, counting only the ones that had time to come back."""
+        answered = self.pings_sent - len(self.outstanding_pings)
+        return self.pings_lost / answered if answered else 0.0
+
+    def report(self):
+        return {
+            'packets_in': self.packets_in,
+            'packets_out': self.packets_out,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'messages_in': {name: {'count': c, 'bytes': b} for name, (c, b) in list(self.messages_in.items())},
+            'messages_out': {name: {'count': c, 'bytes': b} for name, (c, b) in list(self.messages_out.items())},
+            'rtt': self.rtt,
+            'rtt_min': self.rtt_min,
+            'jitter': self.jitter,
+            'loss': self.loss
+        }
+
+
+def _count(table, message_type, size):
+    entry = table.get(message_type)
+    if entry is None:
+        entry = table[message_type] = [0, 0]
+    entry[0] += 1
+    entry[1] += size
+
+
+class NetStats:
+    def __init__(self, dump_path=None, dump_interval=5.0, clock=time.time):
+        self.connections = {}  # addr -> ConnectionStats
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.clock = clock
+        self.last_dump = clock()
+        self.started = clock()
+
+    def connection(self, addr):
+        stats = self.connections.get(addr)
+        if stats is None:
+            stats = self.connections[addr] = ConnectionStats()
+        return stats
+
+    def record_received(self, addr, size, messages):
+        """One datagram of size bytes from addr, and the messages decoded from it."""
+        stats = self.connection(addr)
+        stats.packets_in += 1
+        stats.bytes_in += size
+        for message in messages:
+            _count(stats.messages_in, message['type'], message.get('size', size))
+
+    def record_sent(self, addr, datagrams, packets):
+        """Encoded messages for addr and the packets they went out in after batching."""
+        stats = self.connection(addr)
+        stats.packets_out += len(packets)
+        stats.bytes_out += sum(len(packet) for packet in packets)
+        for datagram in datagrams:
+            # Byte 2 of the header is the message type id
+            _count(stats.messages_out, protocol.MESSAGE_NAMES.get(datagram[2], 'unknown'), len(datagram))
+
+    def ping_sent(self, addr, sent):
+        stats = self.connection(addr)
+        stats.pings_sent += 1
+        stats.outstanding_pings.add(sent)
+
+    def pong_received(self, addr, sent, now):
+        """Returns the round trip time, or None for a pong we didn't ask for or gave up on."""
+        stats = self.connection(addr)
+        if sent not in stats.outstanding_pings:
+            return None
+        stats.outstanding_pings.remove(sent)
+        stats.pongs_received += 1
+        rtt = now - sent
+        stats.add_rtt(rtt)
+        return rtt
+
+    def expire_pings(self, now):
+        for stats in list(self.connections.values()):
+            expired = {sent for sent in stats.outstanding_pings if now - sent > PING_TIMEOUT}
+            stats.outstanding_pings -= expired
+            stats.pings_lost += len(expired)
+
+    def report(self, extra=None):
+        report = {
+            'time': self.clock(),
+            'uptime': self.clock() - self.started,
+            # Copied first: the transport thread adds connections while we read
+            'connections': {f"{addr[0]}:{addr[1]}": stats.report() for addr, stats in list(self.connections.items())}
+        }
+        if extra:
+            report.update(extra)
+        return report
+
+    def maybe_dump(self, now, extra=None):
+        """Append a report to dump_path if dump_interval has passed since the last one."""
+        if not self.dump_path or now - self.last_dump < self.dump_interval:
+            return
+        self.last_dump = now
+        try:
+            with open(self.dump_path, 'a') as f:
+                f.write(json.dumps(self.report(extra)) + '\n')
+        except OSError as e:
+            print(f"Error writing network stats: {e}")
@@ -0,0 +1,300 @@
+"""Capture and replay of a host's network traffic.
+
+A TracingTransport wraps the host's transport and writes every datagram it
+receives or sends to a binary trace file: a short file header, then one
+record per datagram with its direction, the microseconds since the previous
+record, the peer address and the length, followed by the datagram itself.
+A dedicated server also writes an empty record at the start of every tick.
+Start a dedicated server with --trace to record one:
+
+    python server.py --trace match.trace
+
+Replaying feeds the received datagrams to a fresh dedicated server at their
+recorded times, scaled by --speed, with no clients or sockets involved. The
+server ticks where the recorded one did (at its tick rate in trace time for
+version 1 traces, which have no tick records) and its clock (pings, rate
+control, retransmits, lag compensation) reads trace time too, starting from
+the wall clock time the recording started at, so a trace replays the same
+way at any speed. --speed 0 runs as fast as possible:
+
+    python nettrace.py match.trace --speed 10
+
+What the server sends is counted and compared with what the original host
+sent.
+"""
+import argparse
+import socket
+import struct
+import threading
+import time
+
+TRACE_MAGIC = b'PEWTRACE'
+TRACE_VERSION = 2  # 2 added tick records
+FILE_HEADER = struct.Struct('!8sBd')  # magic, trace version, wall clock time at the start
+RECORD = struct.Struct('!BI4sHH')  # direction, microseconds since the previous record, IPv4 address, port, length
+RECEIVED = 0
+SENT = 1
+TICK = 2  # No address or data, the host started a tick
+NO_ADDRESS = ('0.0.0.0', 0)
+
+
+class TraceWriter:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.lock = threading.Lock()  # Receives are written from the socket thread, sends from the main thread
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.records = 0
+        self.errors = 0  # Records that couldn't be written, the datagram still goes through
+        self.addresses = {}  # host -> packed IPv4 address, so hostnames are only resolved once
+        self.file.write(FILE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, time.time()))
+
+    def write(self, direction, addr, data):
+        with self.lock:
+            if self.file is None:
+                return
+            now = time.perf_counter()
+            # Deltas keep records small; a gap longer than 71 minutes is clamped
+            delta = min(int((now - self.last) * 1_000_000), 0xFFFFFFFF)
+            try:
+                record = RECORD.pack(direction, delta, self._pack_address(addr[0]), addr[1], len(data))
+                self.file.write(record)
+                self.file.write(data)
+            except (OSError, struct.error) as e:
+                self.errors += 1
+                print(f"Error writing trace record: {e}")
+                return
+            self.last += delta / 1_000_000
+            self.records += 1
+
+    def _pack_address(self, host):
+        packed = self.addresses.get(host)
+        if packed is None:
+            try:
+                packed = socket.inet_aton(socket.gethostbyname(host))
+            except OSError as e:
+                print(f"Can't resolve {host} for the trace, recording it as 0.0.0.0: {e}")
+                packed = bytes(4)
+            self.addresses[host] = packed
+        return packed
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def _read_header(f, path):
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise ValueError(f"{path} is too short to be a trace")
+    magic, version, started = FILE_HEADER.unpack(header)
+    if magic != TRACE_MAGIC or not 1 <= version <= TRACE_VERSION:
+        raise ValueError(f"{path} is not a version 1 to {TRACE_VERSION} trace")
+    return version, started
+
+
+def read_header(path):
+    """Return a trace's (version, wall clock time it was started at)."""
+    with open(path, 'rb') as f:
+        return _read_header(f, path)
+
+
+def read_trace(path):
+    """Yield (seconds since the start, direction, addr, data) for every record in a trace."""
+    with open(path, 'rb') as f:
+        _read_header(f, path)
+
+        elapsed = 0
+        while True:
+            record = f.read(RECORD.size)
+            if len(record) < RECORD.size:
+                return  # End of file, or a record cut short when the host was killed
+            direction, delta, ip, port, length = RECORD.unpack(record)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            elapsed += delta
+            yield elapsed / 1_000_000, direction, (socket.inet_ntoa(ip), port), data
+
+
+class TracingTransport:
+    """Wraps another transport and records everything that goes through it."""
+
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.writer = TraceWriter(path)
+        self.on_datagrams = None
+
+    @property
+    def address(self):
+        return self.transport.address
+
+    @property
+    def stats(self):
+        return self.transport.stats
+
+    def start(self, on_datagrams):
+        self.on_datagrams = on_datagrams
+        self.transport.start(self._on_datagrams)
+
+    def sendto(self, data, addr):
+        try:
+            self.writer.write(SENT, addr, data)
+        except Exception as e:
+            print(f"Error tracing datagram: {e}")  # Never let tracing stop the send
+        return self.transport.sendto(data, addr)
+
+    def record_tick(self):
+        """Mark the start of a host tick, so a replay can tick at the same times."""
+        self.writer.write(TICK, NO_ADDRESS, b'')
+
+    def close(self):
+        self.transport.close()
+        self.writer.close()
+
+    def _on_datagrams(self, datagrams):
+        for data, addr in datagrams:
+            self.writer.write(RECEIVED, addr, data)
+        self.on_datagrams(datagrams)
+
+
+class ReplayTransport:
+    """Transport for a replayed host: datagrams are pushed in by deliver(), sends are only counted."""
+
+    def __init__(self):
+        self.address = ('replay', 0)
+        self.on_datagrams = None
+        self.stats = {
+            'wakeups': 0,
+            'datagrams': 0,
+            'max_batch': 0,
+            'sent': 0,
+            'bytes_sent': 0
+        }
+
+    def start(self, on_datagrams):
+        self.on_datagrams = on_datagrams
+
+    def deliver(self, datagrams):
+        self.stats['wakeups'] += 1
+        self.stats['datagrams'] += len(datagrams)
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(datagrams))
+        self.on_datagrams(datagrams)
+
+    def sendto(self, data, addr):
+        self.stats['sent'] += 1
+        self.stats['bytes_sent'] += len(data)
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def replay(path, speed=1.0, tick_rate=30, seed=0):
+    """Replay a trace against a new dedicated server. speed 0 means as fast as possible.
+
+    Returns a dict comparing the replay with the recording.
+    """
+    from server import DedicatedServer
+
+    version, started = read_header(path)
+    now = 0.0  # Trace time the server's clock reads
+
+    def clock():
+        return started + now
+
+    transport = ReplayTransport()
+    server = DedicatedServer(tick_rate=tick_rate, seed=seed, transport=transport, clock=clock)
+    network = server.network
+    network.start()
+    tick_interval = server.tick_interval
+    fixed_ticks = version < 2  # Version 1 traces don't say when the host ticked
+
+    recorded = {'datagrams_in': 0, 'datagrams_out': 0, 'bytes_in': 0, 'bytes_out': 0}
+    tick_times = []
+    next_tick = 0.0
+    trace_time = 0.0
+    wall_start = time.perf_counter()
+
+    def run_tick():
+        tick_start = time.perf_counter()
+        server.tick()
+        tick_times.append(time.perf_counter() - tick_start)
+
+    def run_ticks(until):
+        nonlocal next_tick, now
+        while next_tick <= until:
+            now = next_tick
+            run_tick()
+            next_tick += tick_interval
+
+    def wait_for(t):
+        if speed > 0:
+            delay = wall_start + t / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    for trace_time, direction, addr, data in read_trace(path):
+        if direction == SENT:
+            recorded['datagrams_out'] += 1
+            recorded['bytes_out'] += len(data)
+            continue
+        if direction == TICK:
+            wait_for(trace_time)
+            now = trace_time
+            run_tick()
+            continue
+        recorded['datagrams_in'] += 1
+        recorded['bytes_in'] += len(data)
+        if fixed_ticks and next_tick <= trace_time:
+            wait_for(next_tick)
+            run_ticks(trace_time)
+        wait_for(trace_time)
+        now = trace_time
+        transport.deliver([(memoryview(data), addr)])
+    if fixed_ticks:
+        run_ticks(trace_time)
+    wall_time = time.perf_counter() - wall_start
+    network.stop()
+
+    tick_times.sort()
+    return {
+        'trace_time': trace_time,
+        'wall_time': wall_time,
+        'speedup': trace_time / wall_time if wall_time else float('inf'),
+        'ticks': len(tick_times),
+        'tick_time_avg': sum(tick_times) / len(tick_times) if tick_times else 0.0,
+        'tick_time_p99': tick_times[min(len(tick_times) - 1, int(len(tick_times) * 0.99))] if tick_times else 0.0,
+        'tick_time_max': tick_times[-1] if tick_times else 0.0,
+        'players': len(network.clients),
+        'datagrams_in': recorded['datagrams_in'],
+        'bytes_in': recorded['bytes_in'],
+        'recorded_datagrams_out': recorded['datagrams_out'],
+        'recorded_bytes_out': recorded['bytes_out'],
+        'replayed_datagrams_out': transport.stats['sent'],
+        'replayed_bytes_out': transport.stats['bytes_sent']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a network trace against a dedicated server')
+    parser.add_argument('trace', help='Trace file written with server.py --trace')
+    parser.add_argument('--speed', type=float, default=1.0, help='Playback speed, 0 for as fast as possible')
+    parser.add_argument('--tick-rate', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0, help='World seed for the replayed server')
+    args = parser.parse_args()
+
+    result = replay(args.trace, speed=args.speed, tick_rate=args.tick_rate, seed=args.seed)
+    print(f"Replayed {result['trace_time']:.1f} s of traffic in {result['wall_time']:.2f} s "
+          f"({result['speedup']:.1f}x), {result['players']} players")
+    print(f"  in:  {result['datagrams_in']} datagrams, {result['bytes_in']} bytes")
+    print(f"  out: {result['replayed_datagrams_out']} datagrams, {result['replayed_bytes_out']} bytes "
+          f"(recorded {result['recorded_datagrams_out']}, {result['recorded_bytes_out']})")
+    print(f"  {result['ticks']} ticks, {result['tick_time_avg'] * 1000:.2f} ms avg, "
+          f"{result['tick_time_p99'] * 1000:.2f} ms p99, {result['tick_time_max'] * 1000:.2f} ms max")
+
+
+if __name__ == '__main__':
+    main()
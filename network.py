@@ -1,96 +1,373 @@
-import socket
-import json
-import threading
-from ursina import *
+import time
+from collections import deque
+import protocol
+from transport import UDPTransport
+from nettrace import TracingTransport
+from reliability import ReliableChannel
+import interest
+from interest import InterestGrid
+from snapshot import SnapshotEncoder, SnapshotDecoder, make_state, is_player_id
+from interpolation import ClockOffset
+from lagcomp import LagCompensator
+from netstats import NetStats
+from ratecontrol import SendRateController
+from movement import simulate_move, spawn_state
 
-class NetworkManager(Entity):
-    def __init__(self, is_host=False, host='localhost', port=5555):
-        super().__init__()
+# Messages that must arrive, sent through a ReliableChannel. Everything else is
+# sent once and superseded by the next update if lost.
+RELIABLE_TYPES = {'connect', 'connect_ack', 'damage', 'game_state'}
+
+class NetworkManager:
+    """UDP host or client. Doesn't depend on Ursina, so it also runs in the dedicated server.
+
+    update() has to be called once per frame (or server tick) from the main thread.
+    A transport other than a UDP socket can be passed in; it needs start(),
+    sendto(), close() and stats like UDPTransport. Clients joining a match
+    server pass the room_id to play in. With trace_path set, every datagram
+    sent and received is recorded there (see nettrace.py). clock returns the
+    current time in seconds; a replay passes one that follows the trace.
+    """
+    def __init__(self, is_host=False, host='localhost', port=5555, transport=None, room_id=None, trace_path=None,
+                 clock=time.time):
+        self.clock = clock
         self.is_host = is_host
         self.host = host
         self.port = port
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.room_id = room_id
         self.clients = {}
         self.running = False
         self.player_id = str(id(self))[-4:]  # Simple ID based on object id
+        self.protocol_version = protocol.MIN_PROTOCOL_VERSION  # Upgraded once the host acks our connect
+        self.client_versions = {}  # Negotiated protocol version per client (host only)
+        self.connected = is_host
         
-        if is_host:
-            self.socket.bind((host, port))
-        else:
-            self.socket.bind(('', 0))  # Bind to any available port for client
+        # Host tick: outgoing messages are queued and flushed in batches
+        self.tick_interval = 1 / 30
+        self.last_tick = 0
+        self.mtu = protocol.DEFAULT_MTU
+        self.outbox = []  # (message, sender id) pairs waiting for the next tick
+        self.tick_stats = {
+            'ticks': 0,
+            'messages': 0,  # Messages queued for broadcast
+            'deliveries': 0,  # Message copies that had to reach a client
+            'packets_sent': 0,
+            'packets_saved': 0,  # Datagrams avoided by batching
+            'encodes': 0,
+            'snapshot_bytes': 0,  # Bytes of delta snapshots sent
+            'snapshot_bytes_saved': 0,  # Bytes quantization saved on those snapshots
+            'filtered': 0  # Updates skipped or throttled by interest management
+        }
         
-        self.socket.settimeout(0.1)  # Non-blocking mode with timeout
+        # Reliable ordered channel per peer address
+        self.channels = {}
+        
+        # Authoritative movement for clients that send input commands (host only)
+        self.player_movement = {}  # client id -> {'state', 'sequence', 'acked'}
+        
+        # Inbound messages are decoded on the transport thread and handled on the main thread
+        self.inbox = deque()  # (message, addr), appends and pops are thread-safe
+        self.drain_budget = 0.004  # Seconds per frame spent handling inbound messages
+        self.inbox_stats = {
+            'processed': 0,
+            'deferred_frames': 0,  # Frames that ran out of budget with messages left over
+            'max_depth': 0,
+            'latency_avg': 0.0,  # Seconds between receive and handling, smoothed
+            'latency_max': 0.0
+        }
+        
+        # Snapshot rate per client (host) or player update rate (client), adapted to the connection
+        self.send_rates = {}  # client id -> SendRateController (host only)
+        self.send_rate = SendRateController(max_rate=20.0)  # client only
+        
+        # Traffic, round trip time and loss per peer
+        self.net_stats = NetStats(clock=clock)
+        self.ping_interval = 1.0  # Seconds between pings to each peer
+        self.last_ping = 0
+        
+        # Position history for checking client shots where the shooter saw its targets (host only)
+        self.lag_compensation = LagCompensator()
+        self.rewind_positions = {}  # entity id -> position, for things only a listen host simulates (not sent)
+        
+        # Only send clients what is happening near them
+        self.interest = InterestGrid()
+        
+        # Delta snapshots of player positions
+        self.world_state = {}  # player id -> state tuple, the host's view of every player
+        self.snapshot_encoders = {}  # client id -> SnapshotEncoder (host only)
+        self.client_ids = {}  # addr -> client id (host only)
+        self.snapshot_decoder = SnapshotDecoder()  # client only
+        self.start_time = self.clock()  # Snapshots are stamped relative to this on the host
+        self.host_clock = ClockOffset()  # client only
+        
+        if transport is not None:
+            self.transport = transport
+        elif is_host:
+            self.transport = UDPTransport((host, port))
+        else:
+            self.transport = UDPTransport(('', 0))  # Bind to any available port for client
+        if trace_path:
+            self.transport = TracingTransport(self.transport, trace_path)
         
     def start(self):
         self.running = True
-        threading.Thread(target=self._receive_thread, daemon=True).start()
+        self.transport.start(self._on_datagrams)
         print(f"Network {'host' if self.is_host else 'client'} started on {self.host}:{self.port}")
     
     def stop(self):
         self.running = False
-        self.socket.close()
+        self.transport.close()
     
-    def _receive_thread(self):
-        while self.running:
+    def _on_datagrams(self, datagrams):
+        # Runs on the transport thread: decode only, handling happens in drain_inbox
+        received = self.clock()
+        for data, addr in datagrams:
             try:
-                data, addr = self.socket.recvfrom(4096)
-                message = json.loads(data.decode())
-                self._handle_message(message, addr)
-            except socket.timeout:
-                continue
+                messages = protocol.decode_datagram(data)
+                self.net_stats.record_received(addr, len(data), messages)
+                for message in messages:
+                    message['received'] = received
+                    self.inbox.append((message, addr))
+            except protocol.ProtocolError as e:
+                print(f"Dropped bad packet from {addr}: {e}")
             except Exception as e:
                 print(f"Network error: {e}")
     
+    def drain_inbox(self):
+        """Handle queued inbound messages until the queue is empty or the frame budget is spent."""
+        stats = self.inbox_stats
+        stats['max_depth'] = max(stats['max_depth'], len(self.inbox))
+        start = self.clock()
+        while self.inbox:
+            now = self.clock()
+            if now - start > self.drain_budget:
+                stats['deferred_frames'] += 1
+                break
+            message, addr = self.inbox.popleft()
+            latency = now - message['received']
+            stats['latency_avg'] += (latency - stats['latency_avg']) * 0.1
+            stats['latency_max'] = max(stats['latency_max'], latency)
+            stats['processed'] += 1
+            try:
+                self._handle_message(message, addr)
+            except Exception as e:
+                print(f"Error handling {message.get('type')} message: {e}")
+    
+    def queue_depth(self):
+        return len(self.inbox)
+    
     def _handle_message(self, message, addr):
         message_type = message.get('type')
         
         if message_type == 'connect':
             self._handle_connect(message, addr)
+        elif message_type == 'connect_ack':
+            self._handle_connect_ack(message)
         elif message_type == 'player_update':
             self._handle_player_update(message)
         elif message_type == 'shoot':
-            self._handle_shoot(message)
+            self._handle_shoot(message, addr)
         elif message_type == 'damage':
-            self._handle_damage(message)
+            self._handle_damage(message, addr)
+        elif message_type == 'snapshot':
+            self._handle_snapshot(message)
+        elif message_type == 'snapshot_ack':
+            self._handle_snapshot_ack(message, addr)
+        elif message_type == 'input':
+            self._handle_input(message, addr)
+        elif message_type == 'input_ack':
+            self._handle_input_ack(message)
+        elif message_type == 'reliable':
+            self._handle_reliable(message, addr)
+        elif message_type == 'reliable_ack':
+            self._channel(addr).on_ack(message['ack'], message['ack_bits'], self.clock())
+        elif message_type == 'ping':
+            self._handle_ping(message, addr)
+        elif message_type == 'pong':
+            rtt = self.net_stats.pong_received(addr, message['time'], message['received'])
+            if rtt is not None and hasattr(self, 'on_pong'):
+                self.on_pong(rtt)
     
     def _handle_connect(self, message, addr):
         if not self.is_host:
             return
             
         player_id = message['player_id']
+        version = protocol.negotiate_version(message['min_version'], message['max_version'])
+        if version is None:
+            print(f"Rejected player {player_id} from {addr}: protocol "
+                  f"{message['min_version']}-{message['max_version']} not supported")
+            self._send_reliable(addr, {'type': 'connect_ack', 'player_id': self.player_id, 'accepted_version': 0},
+                                protocol.MIN_PROTOCOL_VERSION)
+            return
+        
         self.clients[player_id] = addr
-        print(f"Player {player_id} connected from {addr}")
+        self.client_versions[player_id] = version
+        self.client_ids[addr] = player_id
+        self.snapshot_encoders[player_id] = SnapshotEncoder()
+        self.send_rates[player_id] = SendRateController(max_rate=1 / self.tick_interval)
+        print(f"Player {player_id} connected from {addr} (protocol v{version})")
+        self._send_reliable(addr, {'type': 'connect_ack', 'player_id': self.player_id, 'accepted_version': version},
+                            version)
         
         # Send current game state to the new player
         self.send_state_to_player(player_id)
     
+    def _handle_connect_ack(self, message):
+        if self.is_host:
+            return
+        
+        if message['accepted_version'] == 0:
+            print("Host rejected our protocol version")
+            self.connected = False
+            return
+        
+        self.protocol_version = message['accepted_version']
+        self.connected = True
+        print(f"Connected to host using protocol v{self.protocol_version}")
+    
     def _handle_player_update(self, message):
         # Update other players' positions
         player_id = message['player_id']
+        if player_id in self.player_movement:
+            return  # The host moves this player itself from its input commands
         position = message['position']
         rotation = message['rotation']
         
         # Update the corresponding player entity in the game
         if hasattr(self, 'on_player_update'):
-            self.on_player_update(player_id, position, rotation)
+            self.on_player_update(player_id, position, rotation, message['received'])
+        
+        # Other clients get it with the next delta snapshot
+        if self.is_host:
+            self.world_state[player_id] = make_state(position, rotation)
     
-    def _handle_shoot(self, message):
+    def _handle_snapshot(self, message):
+        if self.is_host:
+            return
+        
+        previous = self.snapshot_decoder.received.get(self.snapshot_decoder.latest_sequence, {})
+        snapshot = self.snapshot_decoder.decode(message['sequence'], message['baseline'], message['entries'])
+        if snapshot is None:
+            return
+        
+        self.send_message({'type': 'snapshot_ack', 'sequence': message['sequence']})
+        
+        # Pass on host timestamps converted to our clock, for interpolation
+        self.host_clock.update(message['host_time'], message['received'])
+        timestamp = self.host_clock.to_local(message['host_time'])
+        for entity_id, state in snapshot.items():
+            if entity_id == self.player_id:
+                continue
+            if is_player_id(entity_id):
+                if hasattr(self, 'on_player_update'):
+                    self.on_player_update(entity_id, state[:3], state[3:], timestamp)
+            elif hasattr(self, 'on_entity_update'):
+                self.on_entity_update(entity_id, state[:3], state[3:], timestamp)
+        for entity_id in previous:
+            if entity_id not in snapshot:
+                if is_player_id(entity_id):
+                    if hasattr(self, 'on_player_removed'):
+                        self.on_player_removed(entity_id)
+                elif hasattr(self, 'on_entity_removed'):
+                    self.on_entity_removed(entity_id)
+    
+    def _handle_snapshot_ack(self, message, addr):
+        client_id = self.client_ids.get(addr)
+        if client_id in self.snapshot_encoders:
+            self.snapshot_encoders[client_id].ack(message['sequence'])
+            self.send_rates[client_id].record_ack()
+    
+    def _handle_reliable(self, message, addr):
+        channel = self._channel(addr)
+        channel.on_ack(message['ack'], message['ack_bits'], self.clock())
+        payloads = channel.receive(
+            message['sequence'], message['fragment_index'], message['fragment_count'], message['payload'])
+        for payload in payloads:
+            try:
+                inner_messages = protocol.decode_datagram(payload)
+            except protocol.ProtocolError as e:
+                print(f"Dropped bad reliable message from {addr}: {e}")
+                continue
+            for inner in inner_messages:
+                inner['received'] = message['received']
+                self._handle_message(inner, addr)
+    
+    def _handle_input(self, message, addr):
+        client_id = self.client_ids.get(addr)
+        if not self.is_host or client_id is None:
+            return
+        
+        movement = self.player_movement.get(client_id)
+        if movement is None:
+            movement = self.player_movement[client_id] = {'state': spawn_state(), 'sequence': 0, 'acked': 0}
+        
+        # Commands are sent more than once to survive packet loss, skip the ones already run
+        for command in sorted(message['commands']):
+            if command.sequence > movement['sequence']:
+                movement['state'] = simulate_move(movement['state'], command)
+                movement['sequence'] = command.sequence
+                movement['yaw'] = command.yaw
+        
+        state = movement['state']
+        position = (state.x, state.y, state.z)
+        rotation = (0.0, movement.get('yaw', 0.0), 0.0)
+        self.world_state[client_id] = make_state(position, rotation)
+        if hasattr(self, 'on_player_update'):
+            self.on_player_update(client_id, position, rotation, message['received'])
+    
+    def _handle_input_ack(self, message):
+        if not self.is_host and hasattr(self, 'on_input_ack'):
+            self.on_input_ack(message['sequence'], message['state'])
+    
+    def _handle_shoot(self, message, addr):
+        if self.is_host:
+            # When the shooter fired, by the host's clock, as far as its view of the world goes
+            message['view_time'] = self.lag_compensation.add_shot(
+                message['player_id'], message['position'], message['direction'],
+                message['received'], self.rtt(addr))
+        
         # Handle bullet creation from other players
         if hasattr(self, 'on_shoot'):
             self.on_shoot(message)
+        
+        if self.is_host:
+            self._queue_message(message, message['player_id'])
     
-    def _handle_damage(self, message):
+    def _handle_damage(self, message, addr):
+        if (self.is_host and addr in self.client_ids and
+                not self.lag_compensation.validate_damage(message['from_player'], message['target_id'],
+                                                          message['amount'], self.clock())):
+            print(f"Rejected damage from {message['from_player']} to {message['target_id']}: no matching shot")
+            return
+        
         # Handle damage from other players
         if hasattr(self, 'on_damage'):
             self.on_damage(message)
+        
+        if self.is_host:
+            self._queue_message(message, message['from_player'])
+    
+    def _handle_ping(self, message, addr):
+        # Answered straight away instead of on the next tick, so the round trip
+        # only includes the network and the wait in the inbox
+        self._transmit(addr, [protocol.encode({'type': 'pong', 'time': message['time']}, message['version'])])
     
     def send_connect(self):
+        if self.room_id is not None:
+            self.send_join()
         self.send_message({
             'type': 'connect',
-            'player_id': self.player_id
+            'player_id': self.player_id,
+            'min_version': protocol.MIN_PROTOCOL_VERSION,
+            'max_version': protocol.PROTOCOL_VERSION
         })
     
     def send_player_update(self, position, rotation):
+        if self.is_host:
+            # Clients get the host's position with the next delta snapshot
+            self.world_state[self.player_id] = make_state(position, rotation)
+            return
+        
         self.send_message({
             'type': 'player_update',
             'player_id': self.player_id,
@@ -98,6 +375,12 @@ class NetworkManager(Entity):
             'rotation': rotation
         })
     
+    def send_input(self, commands):
+        self.send_message({
+            'type': 'input',
+            'commands': commands
+        })
+    
     def send_shoot(self, position, direction):
         self.send_message({
             'type': 'shoot',
@@ -114,19 +397,275 @@ class NetworkManager(Entity):
             'amount': amount
         })
     
+    def send_join(self):
+        """Tell a match server's dispatcher which room our packets are for."""
+        self._transmit((self.host, self.port), [protocol.encode({'type': 'join', 'room': self.room_id},
+                                                                self.protocol_version)])
+    
+    def send_ping(self, addr=None):
+        """Ask a peer (the host by default) to echo our clock. The round trip time goes to on_pong."""
+        addr = addr or (self.host, self.port)
+        now = self.clock()
+        self.net_stats.ping_sent(addr, now)
+        self._transmit(addr, [protocol.encode({'type': 'ping', 'time': now}, self._version_for(addr))])
+    
     def send_message(self, message):
+        if self.is_host:
+            # Broadcast to all clients on the next tick
+            self._queue_message(message, message.get('player_id', ''))
+            return
+        
         try:
-            if self.is_host:
-                # Broadcast to all clients
-                for client_id, addr in self.clients.items():
-                    if client_id != message.get('player_id', ''):
-                        self.socket.sendto(json.dumps(message).encode(), addr)
+            # Send to host
+            datagram = protocol.encode(message, self.protocol_version)
+            if message['type'] in RELIABLE_TYPES:
+                self._channel((self.host, self.port)).send(datagram)
             else:
-                # Send to host
-                self.socket.sendto(json.dumps(message).encode(), (self.host, self.port))
+                self._transmit((self.host, self.port), [datagram])
+        except Exception as e:
+            print(f"Error sending message: {e}")
+    
+    def _queue_message(self, message, sender_id):
+        self.outbox.append((message, sender_id))
+    
+    def update(self):
+        if not self.running:
+            return
+        self.drain_inbox()
+        if self.is_host and self.clock() - self.last_tick >= self.tick_interval:
+            self.tick()
+        self.flush_reliable()
+        self.update_stats()
+    
+    def tick(self):
+        """Send every client its delta snapshot and the queued messages, batched per client."""
+        self.last_tick = self.clock()
+        outbox, self.outbox = self.outbox, []
+        
+        stats = self.tick_stats
+        stats['ticks'] += 1
+        stats['messages'] += len(outbox)
+        world = dict(self.world_state)
+        for player_id, state in world.items():
+            self.interest.update(player_id, state)
+        positions = {entity_id: state[:3] for entity_id, state in world.items()}
+        positions.update(self.rewind_positions)
+        self.lag_compensation.record(self.last_tick, positions)
+        
+        # Encode each message once per protocol version in use, not once per client
+        encoded = {}
+        pending = {}
+        for client_id, addr in self.clients.items():
+            version = self.client_versions.get(client_id, protocol.PROTOCOL_VERSION)
+            datagrams = pending.setdefault(addr, [])
+            
+            # The snapshot is per client since it is a delta against what that client acked,
+            # and only goes out as often as the client's connection can take
+            encoder = self.snapshot_encoders.get(client_id)
+            send_rate = self.send_rates.get(client_id)
+            if encoder and (send_rate is None or send_rate.due(self.last_tick)):
+                others = {}
+                held = set()
+                for player_id, state in world.items():
+                    if player_id == client_id:
+                        continue
+                    relevance = self.interest.relevance(client_id, player_id)
+                    if relevance == interest.NONE:
+                        # Left out entirely, so the client drops it until it comes back in range
+                        stats['filtered'] += 1
+                        continue
+                    others[player_id] = state
+                    # Counted in snapshots this client got, not ticks, so far entities still take
+                    # turns when the client's send rate skips ticks
+                    if not self.interest.should_send(client_id, player_id, encoder.sequence):
+                        stats['filtered'] += 1
+                        held.add(player_id)
+                sequence, baseline, entries = encoder.encode(others, held)
+                datagram = protocol.encode({
+                    'type': 'snapshot',
+                    'sequence': sequence,
+                    'baseline': baseline,
+                    'host_time': self.last_tick - self.start_time,
+                    'entries': entries
+                }, version)
+                stats['snapshot_bytes'] += len(datagram)
+                if version >= protocol.QUANTIZED_VERSION:
+                    # Each field is 2 bytes instead of a 4 byte float
+                    stats['snapshot_bytes_saved'] += 2 * sum(len(values) for _, values in entries.values())
+                datagrams.append(datagram)
+                if send_rate:
+                    send_rate.record_sent()
+            
+            # Tell predicting clients where they really are after their newest command
+            movement = self.player_movement.get(client_id)
+            if movement and movement['sequence'] > movement['acked']:
+                movement['acked'] = movement['sequence']
+                datagrams.append(protocol.encode({
+                    'type': 'input_ack',
+                    'sequence': movement['sequence'],
+                    'state': movement['state']
+                }, version))
+            
+            for index, (message, sender_id) in enumerate(outbox):
+                if client_id == sender_id:
+                    continue
+                if (message['type'] == 'shoot' and
+                        self.interest.relevance_of_position(client_id, message['position']) == interest.NONE):
+                    stats['filtered'] += 1
+                    continue
+                key = (index, version)
+                if key not in encoded:
+                    try:
+                        encoded[key] = protocol.encode(message, version)
+                        stats['encodes'] += 1
+                    except protocol.ProtocolError as e:
+                        print(f"Error encoding message: {e}")
+                        encoded[key] = None
+                if encoded[key] is None:
+                    continue
+                if message['type'] in RELIABLE_TYPES:
+                    self._channel(addr).send(encoded[key])
+                else:
+                    datagrams.append(encoded[key])
+        
+        for addr, datagrams in pending.items():
+            if not datagrams:
+                continue
+            packets = self._transmit(addr, datagrams)
+            stats['deliveries'] += len(datagrams)
+            stats['packets_sent'] += len(packets)
+            stats['packets_saved'] += len(datagrams) - len(packets)
+    
+    def _transmit(self, addr, datagrams):
+        """Batch encoded datagrams for addr into as few packets as fit and send them."""
+        packets = protocol.pack_batches(datagrams, self.mtu)
+        for packet in packets:
+            try:
+                self.transport.sendto(packet, addr)
+            except Exception as e:
+                print(f"Error sending message: {e}")
+        self.net_stats.record_sent(addr, datagrams, packets)
+        return packets
+    
+    def _version_for(self, addr):
+        if self.is_host:
+            return self.client_versions.get(self.client_ids.get(addr), protocol.MIN_PROTOCOL_VERSION)
+        return self.protocol_version
+    
+    def _channel(self, addr):
+        channel = self.channels.get(addr)
+        if channel is None:
+            channel = self.channels[addr] = ReliableChannel()
+        return channel
+    
+    def rtt(self, addr):
+        """Smoothed round trip time to addr in seconds, or None before it has been measured.
+
+        Comes from the pings sent every ping_interval, so it keeps up with the
+        connection. The reliable channel's estimate only stands in until the
+        first pong, since reliable traffic is rare once connected.
+        """
+        connection = self.net_stats.connections.get(addr)
+        if connection and connection.rtt is not None:
+            return connection.rtt
+        channel = self.channels.get(addr)
+        return channel.srtt if channel else None
+    
+    def _send_reliable(self, addr, message, version):
+        try:
+            self._channel(addr).send(protocol.encode(message, version))
         except Exception as e:
             print(f"Error sending message: {e}")
     
+    def flush_reliable(self):
+        """Send new and timed out reliable packets, and acks we owe, on every channel."""
+        now = self.clock()
+        for addr, channel in self.channels.items():
+            version = self._version_for(addr)
+            fragments = channel.poll(now)
+            ack, ack_bits = channel.ack_state()
+            if fragments:
+                datagrams = [protocol.encode({
+                    'type': 'reliable',
+                    'sequence': sequence,
+                    'ack': ack,
+                    'ack_bits': ack_bits,
+                    'fragment_index': index,
+                    'fragment_count': count,
+                    'payload': payload
+                }, version) for sequence, index, count, payload in fragments]
+            elif channel.ack_pending:
+                channel.ack_pending = False
+                datagrams = [protocol.encode({'type': 'reliable_ack', 'ack': ack, 'ack_bits': ack_bits}, version)]
+            else:
+                continue
+            self._transmit(addr, datagrams)
+    
+    def update_stats(self):
+        """Ping peers when it's time to and write the stats file if one is set."""
+        now = self.clock()
+        if now - self.last_ping >= self.ping_interval:
+            self.last_ping = now
+            if self.is_host:
+                for addr in list(self.clients.values()):
+                    self.send_ping(addr)
+            elif self.connected:
+                self.send_ping()
+            elif self.room_id is not None:
+                self.send_join()  # Joins aren't reliable, repeat until the room answers our connect
+        self.net_stats.expire_pings(now)
+        self._adapt_send_rates(now)
+        self.net_stats.maybe_dump(now, self._stats_extra())
+    
+    def _adapt_send_rates(self, now):
+        if self.is_host:
+            # Snapshot acks tell us how many snapshots got through
+            for client_id, addr in list(self.clients.items()):
+                connection = self.net_stats.connection(addr)
+                self.send_rates[client_id].adapt(now, connection.bytes_out,
+                                                 rtt=connection.rtt, rtt_min=connection.rtt_min)
+        else:
+            # Player updates aren't acked, pings lost since the last adapt stand in for them
+            connection = self.net_stats.connection((self.host, self.port))
+            self.send_rate.adapt(now, connection.bytes_out, pings=(connection.pongs_received, connection.pings_lost),
+                                 rtt=connection.rtt, rtt_min=connection.rtt_min)
+    
+    def update_due(self, now):
+        """True when it's time to send our player's state again, at the rate our connection allows."""
+        if self.is_host:
+            return True  # The host only updates its own world state, snapshots are rate limited per client
+        return self.send_rate.due(now)
+    
+    def effective_send_rates(self):
+        """Updates per second currently sent to each client (host) or to the host (client)."""
+        if self.is_host:
+            return {client_id: send_rate.rate for client_id, send_rate in self.send_rates.items()}
+        return {self.player_id: self.send_rate.rate}
+    
+    def get_stats(self):
+        """Everything we measure about the network, as a JSON friendly dict."""
+        report = self.net_stats.report(self._stats_extra())
+        for addr, player_id in list(self.client_ids.items()):
+            connection = report['connections'].get(f"{addr[0]}:{addr[1]}")
+            if connection is not None:
+                connection['player_id'] = player_id
+                if player_id in self.send_rates:
+                    connection['send_rate'] = self.send_rates[player_id].rate
+        if not self.is_host:
+            connection = report['connections'].get(f"{self.host}:{self.port}")
+            if connection is not None:
+                connection['send_rate'] = self.send_rate.rate
+        return report
+    
+    def _stats_extra(self):
+        return {
+            'player_id': self.player_id,
+            'is_host': self.is_host,
+            'queue_depth': len(self.inbox),
+            'inbox': dict(self.inbox_stats),
+            'tick': dict(self.tick_stats)
+        }
+    
     def send_state_to_player(self, player_id):
         if not self.is_host or not hasattr(self, 'get_game_state'):
             return
@@ -138,4 +677,4 @@ class NetworkManager(Entity):
         }
         
         if player_id in self.clients:
-            self.socket.sendto(json.dumps(message).encode(), self.clients[player_id])
+            self._send_reliable(self.clients[player_id], message, self.client_versions[player_id])
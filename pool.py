@@ -0,0 +1,69 @@
+"""Reusable object pool.
+
+Objects that are created and thrown away many times a second (bullets) are
+expensive to build when they are Ursina entities: each one gets a scene
+node, a model and a collider. A pool keeps released objects around and
+hands them out again with reset() instead of constructing new ones.
+
+The pool grows on demand up to max_size objects in total. Past that,
+acquire() returns None and the request is counted as dropped, so a burst of
+fire can't allocate without bound. An object whose reset() raises goes
+straight back to the free list and acquire() returns None for it.
+"""
+
+
+class ObjectPool:
+    def __init__(self, factory, max_size=512):
+        self.factory = factory  # Called with no arguments to make a new, inactive object
+        self.max_size = max_size
+        self.free = []
+        self.active = {}  # id -> object, so objects don't need to be hashable
+        self.stats = {
+            'created': 0,
+            'hits': 0,  # acquire() served from a released object
+            'misses': 0,  # acquire() had to create one
+            'dropped': 0,  # acquire() refused because the pool was at max_size
+            'errors': 0,  # acquire() gave up because reset() raised
+            'peak_active': 0
+        }
+
+    @property
+    def size(self):
+        return len(self.free) + len(self.active)
+
+    def prewarm(self, count):
+        """Create objects up front so the first shots of a game don't allocate."""
+        while len(self.free) < count and self.size < self.max_size:
+            self.free.append(self.factory())
+            self.stats['created'] += 1
+
+    def acquire(self, **kwargs):
+        """Return an object reset with kwargs, or None if the pool is exhausted."""
+        if self.free:
+            obj = self.free.pop()
+            self.stats['hits'] += 1
+        elif self.size < self.max_size:
+            obj = self.factory()
+            self.stats['created'] += 1
+            self.stats['misses'] += 1
+        else:
+            self.stats['dropped'] += 1
+            return None
+        try:
+            obj.reset(**kwargs)
+        except Exception as e:
+            print(f"Error resetting pooled object: {e}")
+            self.free.append(obj)
+            self.stats['errors'] += 1
+            return None
+        self.active[id(obj)] = obj
+        self.stats['peak_active'] = max(self.stats['peak_active'], len(self.active))
+        return obj
+
+    def release(self, obj):
+        """Give an object back. Releasing one that isn't active does nothing."""
+        if self.active.pop(id(obj), None) is not None:
+            self.free.append(obj)
+
+    def report(self):
+        return dict(self.stats, active=len(self.active), free=len(self.free))
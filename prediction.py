@@ -0,0 +1,59 @@
+"""Client-side prediction with server reconciliation.
+
+The client applies its own input immediately and keeps every command the
+host hasn't acknowledged yet. When the host's authoritative state for a
+command arrives it is compared with what was predicted for that command; on
+a mismatch the client snaps to the host's state and replays the newer
+commands on top of it.
+"""
+from collections import deque
+
+from movement import simulate_move
+
+
+class ClientPredictor:
+    def __init__(self, state, max_pending=128, tolerance=0.01):
+        self.state = state
+        self.tolerance = tolerance  # Allowed error per axis before correcting
+        self.pending = deque(maxlen=max_pending)  # (command, predicted state after it)
+        self.next_sequence = 1
+        self.acked_sequence = 0
+        self.corrections = 0
+
+    def apply(self, command):
+        """Predict the result of a new local command and remember it for reconciliation."""
+        self.state = simulate_move(self.state, command)
+        self.pending.append((command, self.state))
+        self.next_sequence = command.sequence + 1
+        return self.state
+
+    def unacked_commands(self, limit=None):
+        commands = [command for command, _ in self.pending]
+        return commands[-limit:] if limit else commands
+
+    def reconcile(self, acked_sequence, authoritative):
+        """Apply an authoritative state for acked_sequence.
+
+        Returns the corrected current state, or None if the prediction was right.
+        """
+        if acked_sequence <= self.acked_sequence:
+            return None  # Stale or duplicate ack
+        self.acked_sequence = acked_sequence
+
+        predicted = None
+        while self.pending and self.pending[0][0].sequence <= acked_sequence:
+            command, predicted = self.pending.popleft()
+        if predicted is not None and all(
+                abs(a - b) <= self.tolerance for a, b in zip(predicted, authoritative)):
+            return None
+
+        # Rewind to the host's state and replay everything it hasn't processed yet
+        self.corrections += 1
+        state = authoritative
+        replayed = deque(maxlen=self.pending.maxlen)
+        for command, _ in self.pending:
+            state = simulate_move(state, command)
+            replayed.append((command, state))
+        self.pending = replayed
+        self.state = state
+        return state
@@ -0,0 +1,194 @@
+"""Projectiles as NumPy arrays instead of one entity each.
+
+Every live projectile is a row in a set of parallel arrays (structure of
+arrays): position, previous position, velocity, damage, owner, birth time
+and color. step() moves, expires and collision-tests all of them at once
+with array operations, so the cost per step barely depends on how many are
+in flight. Rows are kept packed: removed projectiles are dropped by
+compacting the arrays, so rows 0 to count-1 are always the live ones and
+can be handed to a single point-cloud node for drawing.
+
+Collisions use the same swept tests as collision.py, vectorized: each
+projectile's path this step against a sphere around every target and
+against static boxes, earliest contact wins.
+"""
+import numpy as np
+
+from simulation import BULLET_LIFETIME, HIT_RADIUS
+
+DEFAULT_CAPACITY = 256
+MAX_CAPACITY = 16384
+
+
+class ProjectileSystem:
+    def __init__(self, capacity=DEFAULT_CAPACITY, max_capacity=MAX_CAPACITY, lifetime=BULLET_LIFETIME,
+                 hit_radius=HIT_RADIUS):
+        self.max_capacity = max_capacity
+        self.lifetime = lifetime
+        self.hit_radius = hit_radius
+        self.count = 0
+        self.owner_ids = []  # owner index -> owner id, owners are stored as small ints
+        self.owner_index = {}
+        self._allocate(capacity)
+        self.stats = {
+            'spawned': 0,
+            'dropped': 0,  # Spawns refused at max_capacity
+            'hits': 0,
+            'expired': 0,
+            'peak': 0
+        }
+
+    def _allocate(self, capacity):
+        old_count = self.count
+        arrays = {
+            'position': np.zeros((capacity, 3), np.float32),
+            'previous': np.zeros((capacity, 3), np.float32),
+            'velocity': np.zeros((capacity, 3), np.float32),
+            'damage': np.zeros(capacity, np.float32),
+            'owner': np.zeros(capacity, np.int32),
+            'birth': np.zeros(capacity, np.float64),
+            'color': np.ones((capacity, 4), np.float32)
+        }
+        for name, array in arrays.items():
+            if old_count:
+                array[:old_count] = getattr(self, name)[:old_count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def spawn(self, position, direction, speed, damage, owner_id, now, color=(1, 1, 0, 1)):
+        """Add a projectile. Returns its row, or None if max_capacity projectiles are already flying."""
+        if self.count == self.capacity:
+            if self.capacity >= self.max_capacity:
+                self.stats['dropped'] += 1
+                return None
+            self._allocate(min(self.capacity * 2, self.max_capacity))
+
+        direction = np.asarray(tuple(direction), np.float32)
+        length = np.linalg.norm(direction)
+        direction = direction / length if length > 0 else np.array((1, 0, 0), np.float32)
+
+        owner = self.owner_index.get(owner_id)
+        if owner is None:
+            owner = self.owner_index[owner_id] = len(self.owner_ids)
+            self.owner_ids.append(owner_id)
+
+        row = self.count
+        self.position[row] = tuple(position)
+        self.previous[row] = self.position[row]
+        self.velocity[row] = direction * speed
+        self.damage[row] = damage
+        self.owner[row] = owner
+        self.birth[row] = now
+        self.color[row] = tuple(color)[:4] if len(color) >= 4 else tuple(color)[:3] + (1,)
+        self.count += 1
+        self.stats['spawned'] += 1
+        self.stats['peak'] = max(self.stats['peak'], self.count)
+        return row
+
+    def step(self, dt, now, targets=None, statics=()):
+        """Move every projectile by dt and test its path this step.
+
+        targets is an (M, 3) array of target centers, each with hit_radius;
+        statics are (min corner, max corner, ...) boxes. Returns a list of
+        (target index, damage, owner id) for every projectile that hit a
+        target. Projectiles that hit anything or outlive lifetime are removed.
+        """
+        n = self.count
+        if n == 0:
+            return []
+        position = self.position[:n]
+        self.previous[:n] = position
+        start = self.previous[:n]
+        position += self.velocity[:n] * dt
+        segment = position - start
+
+        # Earliest contact along this step, as a fraction of the segment; inf for none
+        t_target = np.full(n, np.inf, np.float32)
+        target_hit = np.full(n, -1, np.int64)
+        if targets is not None and len(targets):
+            t_all = _segments_spheres(start, segment, np.asarray(targets, np.float32), self.hit_radius)
+            target_hit = np.argmin(t_all, axis=1)
+            t_target = t_all[np.arange(n), target_hit]
+        t_static = np.full(n, np.inf, np.float32)
+        for box in statics:
+            np.minimum(t_static, _segments_box(start, segment, box[0], box[1]), out=t_static)
+
+        hit_target = t_target < t_static  # Only counts if no wall was in the way first
+        removed = hit_target | np.isfinite(t_static)
+        expired = (now - self.birth[:n]) > self.lifetime
+        removed |= expired
+
+        rows = np.nonzero(hit_target)[0]
+        hits = [(int(target_hit[row]), float(self.damage[row]), self.owner_ids[self.owner[row]]) for row in rows]
+        self.stats['hits'] += len(hits)
+        self.stats['expired'] += int(np.count_nonzero(expired & ~hit_target))
+
+        if removed.any():
+            keep = np.nonzero(~removed)[0]
+            count = len(keep)
+            for array in (self.position, self.previous, self.velocity, self.damage, self.owner, self.birth,
+                          self.color):
+                array[:count] = array[keep]
+            self.count = count
+        return hits
+
+    def nearby(self, grid, dt):
+        """Objects in a SpatialHash close enough to some projectile to be hit in the next step of dt.
+
+        Only the cells the projectiles are in are looked up, padded by how far
+        the fastest one can get this step plus hit_radius, so targets nowhere
+        near a projectile are never tested.
+        """
+        n = self.count
+        if n == 0:
+            return []
+        size = grid.cell_size
+        reach = float(np.sqrt((self.velocity[:n] ** 2).sum(axis=1)).max()) * dt + self.hit_radius
+        cells = np.unique(np.floor(self.position[:n][:, (0, 2)] / size).astype(np.int64), axis=0)
+        found = {}
+        for x, z in cells.tolist():
+            for obj in grid.query_box(x * size - reach, z * size - reach, (x + 1) * size + reach, (z + 1) * size + reach):
+                found[id(obj)] = obj
+        return list(found.values())
+
+    def interpolated_positions(self, alpha):
+        """Positions of the live projectiles drawn alpha of the way through the last step."""
+        n = self.count
+        return (self.previous[:n] + (self.position[:n] - self.previous[:n]) * alpha).astype(np.float32, copy=False)
+
+    def clear(self):
+        self.count = 0
+
+    def report(self):
+        return dict(self.stats, live=self.count, capacity=self.capacity)
+
+
+def _segments_spheres(start, segment, centers, radius):
+    """(N, M) fractions where each segment first comes within radius of each center, inf for never."""
+    f = start[:, None, :] - centers[None, :, :]  # (N, M, 3)
+    c = np.einsum('nmk,nmk->nm', f, f) - radius * radius
+    b = np.einsum('nmk,nk->nm', f, segment)
+    a = np.einsum('nk,nk->n', segment, segment)[:, None]
+    discriminant = b * b - a * c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (-b - np.sqrt(np.maximum(discriminant, 0))) / a
+    hit = (b < 0) & (discriminant >= 0) & (t <= 1)
+    t = np.where(hit, t, np.inf)
+    return np.where(c <= 0, 0.0, t).astype(np.float32)  # Starting inside counts as touching at once
+
+
+def _segments_box(start, segment, box_min, box_max):
+    """(N,) fractions where each segment first enters the box, inf for never (slab test)."""
+    box_min = np.asarray(box_min, np.float32)
+    box_max = np.asarray(box_max, np.float32)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_low = (box_min - start) / segment
+        t_high = (box_max - start) / segment
+    # Axes the segment doesn't move along: inside the slab for all t, or never
+    still = segment == 0
+    inside = (start >= box_min) & (start <= box_max)
+    t_low = np.where(still, np.where(inside, -np.inf, np.inf), t_low)
+    t_high = np.where(still, np.where(inside, np.inf, -np.inf), t_high)
+    t_enter = np.maximum(np.minimum(t_low, t_high).max(axis=1), 0)
+    t_exit = np.minimum(np.maximum(t_low, t_high).min(axis=1), 1)
+    return np.where(t_enter <= t_exit, t_enter, np.inf).astype(np.float32)
@@ -0,0 +1,502 @@
+"""Binary wire protocol used by NetworkManager.
+
+Every datagram starts with a fixed 3 byte header (magic, protocol version,
+message type id) followed by a fixed-layout body for that message type.
+Messages are still handled as plain dicts everywhere else in the game, this
+module only converts them to and from bytes.
+"""
+import json
+import struct
+
+from movement import InputCommand, MoveState
+from quantize import Quantizer
+
+PROTOCOL_MAGIC = 0xF5
+PROTOCOL_VERSION = 2  # Newest version this build can speak
+MIN_PROTOCOL_VERSION = 1  # Oldest version this build still accepts
+QUANTIZED_VERSION = 2  # From this version on positions, rotations and directions are quantized
+
+QUANTIZER = Quantizer()  # Both sides must use the same settings
+
+ID_SIZE = 4  # Player ids are the last 4 digits of an object id
+
+# Numeric message type ids
+MESSAGE_TYPES = {
+    'connect': 1,
+    'connect_ack': 2,
+    'player_update': 3,
+    'shoot': 4,
+    'damage': 5,
+    'game_state': 6,
+    'batch': 7,
+    'snapshot': 8,
+    'snapshot_ack': 9,
+    'input': 10,
+    'input_ack': 11,
+    'reliable': 12,
+    'reliable_ack': 13,
+    'ping': 14,
+    'pong': 15,
+    'join': 16,
+}
+MESSAGE_NAMES = {type_id: name for name, type_id in MESSAGE_TYPES.items()}
+
+HEADER = struct.Struct('!BBB')  # magic, version, message type
+
+CONNECT = struct.Struct('!4sBB')  # player id, min version, max version
+CONNECT_ACK = struct.Struct('!4sB')  # host player id, accepted version (0 = rejected)
+PLAYER_UPDATE = struct.Struct('!4s3f3f')  # player id, position, rotation
+SHOOT = struct.Struct('!4s3f3f')  # player id, position, direction
+DAMAGE = struct.Struct('!4s4sf')  # from player, target id, amount
+SNAPSHOT = struct.Struct('!IIIH')  # sequence, baseline sequence, host time in ms, entry count
+SNAPSHOT_ENTRY = struct.Struct('!4sB')  # entity id, changed field mask, then one float per set bit
+SNAPSHOT_ACK = struct.Struct('!I')  # sequence
+INPUT = struct.Struct('!B')  # command count
+INPUT_COMMAND = struct.Struct('!IfbbBf')  # sequence, dt, forward, right, flags, yaw
+INPUT_ACK = struct.Struct('!I4f')  # last processed sequence, x, y, z, y velocity
+INPUT_JUMP = 1
+INPUT_SLIDE = 2
+RELIABLE = struct.Struct('!HHIBB')  # sequence, ack, ack bits, fragment index, fragment count, then payload
+RELIABLE_ACK = struct.Struct('!HI')  # ack, ack bits
+PING = struct.Struct('!d')  # sender's clock when sent, echoed back in the pong
+JOIN = struct.Struct('!I')  # room id, read by a match server's dispatcher
+# Quantized layouts (version 2)
+PLAYER_UPDATE_Q = struct.Struct('!4s3H3H')  # player id, position, rotation
+SHOOT_Q = struct.Struct('!4s3H2H')  # player id, position, octahedral direction
+BATCH_ITEM = struct.Struct('!H')  # length of the type id + body that follows
+
+DEFAULT_MTU = 1200  # Stay well under the usual 1500 byte Ethernet MTU
+
+
+class ProtocolError(ValueError):
+    """Raised when a datagram or message can't be encoded or decoded."""
+
+
+def pack_id(player_id):
+    data = str(player_id).encode()
+    if len(data) > ID_SIZE:
+        raise ProtocolError(f"Player id too long: {player_id!r}")
+    return data
+
+
+def unpack_id(data):
+    return data.rstrip(b'\0').decode()
+
+
+def negotiate_version(min_version, max_version):
+    """Pick the newest version both sides support, or None if there is none."""
+    version = min(max_version, PROTOCOL_VERSION)
+    if version < max(min_version, MIN_PROTOCOL_VERSION):
+        return None
+    return version
+
+
+def _encode_connect(message):
+    return CONNECT.pack(
+        pack_id(message['player_id']),
+        message.get('min_version', MIN_PROTOCOL_VERSION),
+        message.get('max_version', PROTOCOL_VERSION)
+    )
+
+
+def _decode_connect(body):
+    player_id, min_version, max_version = CONNECT.unpack(body)
+    return {
+        'player_id': unpack_id(player_id),
+        'min_version': min_version,
+        'max_version': max_version
+    }
+
+
+def _encode_connect_ack(message):
+    return CONNECT_ACK.pack(pack_id(message['player_id']), message['accepted_version'])
+
+
+def _decode_connect_ack(body):
+    player_id, accepted_version = CONNECT_ACK.unpack(body)
+    return {'player_id': unpack_id(player_id), 'accepted_version': accepted_version}
+
+
+def _encode_player_update(message):
+    return PLAYER_UPDATE.pack(
+        pack_id(message['player_id']),
+        *message['position'],
+        *message['rotation']
+    )
+
+
+def _decode_player_update(body):
+    values = PLAYER_UPDATE.unpack(body)
+    return {
+        'player_id': unpack_id(values[0]),
+        'position': values[1:4],
+        'rotation': values[4:7]
+    }
+
+
+def _encode_shoot(message):
+    return SHOOT.pack(
+        pack_id(message['player_id']),
+        *message['position'],
+        *message['direction']
+    )
+
+
+def _decode_shoot(body):
+    values = SHOOT.unpack(body)
+    return {
+        'player_id': unpack_id(values[0]),
+        'position': values[1:4],
+        'direction': values[4:7]
+    }
+
+
+def _encode_damage(message):
+    return DAMAGE.pack(
+        pack_id(message['from_player']),
+        pack_id(message['target_id']),
+        message['amount']
+    )
+
+
+def _decode_damage(body):
+    from_player, target_id, amount = DAMAGE.unpack(body)
+    return {
+        'from_player': unpack_id(from_player),
+        'target_id': unpack_id(target_id),
+        'amount': amount
+    }
+
+
+def _encode_player_update_q(message):
+    q = QUANTIZER
+    return PLAYER_UPDATE_Q.pack(
+        pack_id(message['player_id']),
+        *(q.position(v) for v in message['position']),
+        *(q.angle(v) for v in message['rotation'])
+    )
+
+
+def _decode_player_update_q(body):
+    q = QUANTIZER
+    values = PLAYER_UPDATE_Q.unpack(body)
+    return {
+        'player_id': unpack_id(values[0]),
+        'position': tuple(q.unposition(v) for v in values[1:4]),
+        'rotation': tuple(q.unangle(v) for v in values[4:7])
+    }
+
+
+def _encode_shoot_q(message):
+    q = QUANTIZER
+    return SHOOT_Q.pack(
+        pack_id(message['player_id']),
+        *(q.position(v) for v in message['position']),
+        *q.normal(message['direction'])
+    )
+
+
+def _decode_shoot_q(body):
+    q = QUANTIZER
+    values = SHOOT_Q.unpack(body)
+    return {
+        'player_id': unpack_id(values[0]),
+        'position': tuple(q.unposition(v) for v in values[1:4]),
+        'direction': q.unnormal(values[4:6])
+    }
+
+
+def _snapshot_fields(mask):
+    """Indexes of the fields present in an entry, in the order their values are sent."""
+    return [i for i in range(6) if mask & (1 << i)]
+
+
+def _encode_snapshot(message, quantized=False):
+    entries = message['entries']
+    host_time = int(message['host_time'] * 1000) & 0xFFFFFFFF
+    parts = [SNAPSHOT.pack(message['sequence'], message['baseline'], host_time, len(entries))]
+    q = QUANTIZER
+    for entity_id, (mask, values) in entries.items():
+        parts.append(SNAPSHOT_ENTRY.pack(pack_id(entity_id), mask))
+        if quantized:
+            # Fields 0-2 are the position, 3-5 the rotation
+            values = [q.position(v) if i < 3 else q.angle(v) for i, v in zip(_snapshot_fields(mask), values)]
+            parts.append(struct.pack(f'!{len(values)}H', *values))
+        else:
+            parts.append(struct.pack(f'!{len(values)}f', *values))
+    return b''.join(parts)
+
+
+def _decode_snapshot(body, quantized=False):
+    q = QUANTIZER
+    sequence, baseline, host_time, count = SNAPSHOT.unpack_from(body)
+    offset = SNAPSHOT.size
+    entries = {}
+    for _ in range(count):
+        entity_id, mask = SNAPSHOT_ENTRY.unpack_from(body, offset)
+        offset += SNAPSHOT_ENTRY.size
+        fields = _snapshot_fields(mask)
+        if quantized:
+            values = struct.unpack_from(f'!{len(fields)}H', body, offset)
+            values = tuple(q.unposition(v) if i < 3 else q.unangle(v) for i, v in zip(fields, values))
+            offset += 2 * len(fields)
+        else:
+            values = struct.unpack_from(f'!{len(fields)}f', body, offset)
+            offset += 4 * len(fields)
+        entries[unpack_id(entity_id)] = (mask, values)
+    return {'sequence': sequence, 'baseline': baseline, 'host_time': host_time / 1000, 'entries': entries}
+
+
+def _encode_snapshot_q(message):
+    return _encode_snapshot(message, quantized=True)
+
+
+def _decode_snapshot_q(body):
+    return _decode_snapshot(body, quantized=True)
+
+
+def _encode_snapshot_ack(message):
+    return SNAPSHOT_ACK.pack(message['sequence'])
+
+
+def _decode_snapshot_ack(body):
+    (sequence,) = SNAPSHOT_ACK.unpack(body)
+    return {'sequence': sequence}
+
+
+def _encode_input(message):
+    commands = message['commands']
+    parts = [INPUT.pack(len(commands))]
+    for command in commands:
+        flags = (INPUT_JUMP if command.jump else 0) | (INPUT_SLIDE if command.slide else 0)
+        parts.append(INPUT_COMMAND.pack(
+            command.sequence, command.dt, command.forward, command.right, flags, command.yaw))
+    return b''.join(parts)
+
+
+def _decode_input(body):
+    (count,) = INPUT.unpack_from(body)
+    commands = []
+    for i in range(count):
+        sequence, dt, forward, right, flags, yaw = INPUT_COMMAND.unpack_from(
+            body, INPUT.size + i * INPUT_COMMAND.size)
+        commands.append(InputCommand(
+            sequence, dt, forward, right, bool(flags & INPUT_JUMP), bool(flags & INPUT_SLIDE), yaw))
+    return {'commands': commands}
+
+
+def _encode_input_ack(message):
+    return INPUT_ACK.pack(message['sequence'], *message['state'])
+
+
+def _decode_input_ack(body):
+    sequence, *state = INPUT_ACK.unpack(body)
+    return {'sequence': sequence, 'state': MoveState(*state)}
+
+
+def _encode_reliable(message):
+    return RELIABLE.pack(
+        message['sequence'],
+        message['ack'],
+        message['ack_bits'],
+        message['fragment_index'],
+        message['fragment_count']
+    ) + message['payload']
+
+
+def _decode_reliable(body):
+    sequence, ack, ack_bits, fragment_index, fragment_count = RELIABLE.unpack_from(body)
+    return {
+        'sequence': sequence,
+        'ack': ack,
+        'ack_bits': ack_bits,
+        'fragment_index': fragment_index,
+        'fragment_count': fragment_count,
+        'payload': bytes(body[RELIABLE.size:])  # Copied, the receive buffer gets reused
+    }
+
+
+def _encode_reliable_ack(message):
+    return RELIABLE_ACK.pack(message['ack'], message['ack_bits'])
+
+
+def _decode_reliable_ack(body):
+    ack, ack_bits = RELIABLE_ACK.unpack(body)
+    return {'ack': ack, 'ack_bits': ack_bits}
+
+
+def _encode_ping(message):
+    return PING.pack(message['time'])
+
+
+def _decode_ping(body):
+    (sent,) = PING.unpack(body)
+    return {'time': sent}
+
+
+def _encode_join(message):
+    return JOIN.pack(message['room'])
+
+
+def _decode_join(body):
+    (room,) = JOIN.unpack(body)
+    return {'room': room}
+
+
+def _encode_game_state(message):
+    # The game state is free-form and only sent on join, so it stays JSON
+    return json.dumps(message['state'], separators=(',', ':')).encode()
+
+
+def _decode_game_state(body):
+    return {'state': json.loads(bytes(body).decode())}
+
+
+_ENCODERS = {
+    'connect': _encode_connect,
+    'connect_ack': _encode_connect_ack,
+    'player_update': _encode_player_update,
+    'shoot': _encode_shoot,
+    'damage': _encode_damage,
+    'game_state': _encode_game_state,
+    'snapshot': _encode_snapshot,
+    'snapshot_ack': _encode_snapshot_ack,
+    'input': _encode_input,
+    'input_ack': _encode_input_ack,
+    'reliable': _encode_reliable,
+    'reliable_ack': _encode_reliable_ack,
+    'ping': _encode_ping,
+    'pong': _encode_ping,
+    'join': _encode_join,
+}
+
+_DECODERS = {
+    'connect': _decode_connect,
+    'connect_ack': _decode_connect_ack,
+    'player_update': _decode_player_update,
+    'shoot': _decode_shoot,
+    'damage': _decode_damage,
+    'game_state': _decode_game_state,
+    'snapshot': _decode_snapshot,
+    'snapshot_ack': _decode_snapshot_ack,
+    'input': _decode_input,
+    'input_ack': _decode_input_ack,
+    'reliable': _decode_reliable,
+    'reliable_ack': _decode_reliable_ack,
+    'ping': _decode_ping,
+    'pong': _decode_ping,
+    'join': _decode_join,
+}
+
+
+# Version 2 only changes how these are laid out
+_QUANTIZED_ENCODERS = dict(_ENCODERS, player_update=_encode_player_update_q, shoot=_encode_shoot_q,
+                           snapshot=_encode_snapshot_q)
+_QUANTIZED_DECODERS = dict(_DECODERS, player_update=_decode_player_update_q, shoot=_decode_shoot_q,
+                           snapshot=_decode_snapshot_q)
+
+
+def encode(message, version=PROTOCOL_VERSION):
+    """Encode a message dict into a datagram."""
+    message_type = message.get('type')
+    if message_type not in MESSAGE_TYPES:
+        raise ProtocolError(f"Unknown message type: {message_type!r}")
+    try:
+        encoders = _QUANTIZED_ENCODERS if version >= QUANTIZED_VERSION else _ENCODERS
+        body = encoders[message_type](message)
+    except (KeyError, TypeError, struct.error) as e:
+        raise ProtocolError(f"Malformed {message_type} message: {e}") from e
+    return HEADER.pack(PROTOCOL_MAGIC, version, MESSAGE_TYPES[message_type]) + body
+
+
+def _decode_body(type_id, body, version):
+    message_type = MESSAGE_NAMES.get(type_id)
+    if message_type is None or message_type == 'batch':
+        raise ProtocolError(f"Unknown message type id {type_id}")
+    try:
+        decoders = _QUANTIZED_DECODERS if version >= QUANTIZED_VERSION else _DECODERS
+        message = decoders[message_type](body)
+    except (struct.error, ValueError) as e:
+        raise ProtocolError(f"Malformed {message_type} message: {e}") from e
+    message['type'] = message_type
+    message['version'] = version
+    return message
+
+
+def _decode_header(data):
+    if len(data) < HEADER.size:
+        raise ProtocolError("Datagram too short")
+    magic, version, type_id = HEADER.unpack_from(data)
+    if magic != PROTOCOL_MAGIC:
+        raise ProtocolError("Bad magic byte")
+    if not MIN_PROTOCOL_VERSION <= version <= PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    return version, type_id
+
+
+def decode(data):
+    """Decode a single-message datagram into a message dict with 'type' and 'version' set."""
+    version, type_id = _decode_header(data)
+    return _decode_body(type_id, memoryview(data)[HEADER.size:], version)
+
+
+def decode_datagram(data):
+    """Decode a datagram into a list of message dicts, unpacking batches.
+
+    Each message also gets 'size', the bytes it took up in the datagram.
+    """
+    version, type_id = _decode_header(data)
+    if type_id != MESSAGE_TYPES['batch']:
+        message = _decode_body(type_id, memoryview(data)[HEADER.size:], version)
+        message['size'] = len(data)
+        return [message]
+
+    messages = []
+    view = memoryview(data)
+    offset = HEADER.size
+    while offset < len(view):
+        if offset + BATCH_ITEM.size > len(view):
+            raise ProtocolError("Truncated batch item header")
+        (length,) = BATCH_ITEM.unpack_from(view, offset)
+        offset += BATCH_ITEM.size
+        if length == 0 or offset + length > len(view):
+            raise ProtocolError("Truncated batch item")
+        message = _decode_body(view[offset], view[offset + 1:offset + length], version)
+        message['size'] = BATCH_ITEM.size + length  # Share of the datagram, for stats
+        messages.append(message)
+        offset += length
+    return messages
+
+
+def pack_batches(datagrams, mtu=DEFAULT_MTU):
+    """Pack already encoded datagrams of one version into as few datagrams as fit the MTU.
+
+    A datagram that ends up alone is sent unchanged, so batching never costs
+    extra bytes. Datagrams larger than the MTU are passed through on their own.
+    """
+    packets = []
+    group = []
+    size = HEADER.size
+
+    def flush():
+        if len(group) == 1:
+            packets.append(group[0])
+        elif group:
+            # Batch items drop the magic and version bytes, the batch header carries them
+            parts = [HEADER.pack(PROTOCOL_MAGIC, group[0][1], MESSAGE_TYPES['batch'])]
+            for datagram in group:
+                item = datagram[HEADER.size - 1:]
+                parts.append(BATCH_ITEM.pack(len(item)))
+                parts.append(item)
+            packets.append(b''.join(parts))
+
+    for datagram in datagrams:
+        item_size = BATCH_ITEM.size + len(datagram) - (HEADER.size - 1)
+        if group and size + item_size > mtu:
+            flush()
+            group = []
+            size = HEADER.size
+        group.append(datagram)
+        size += item_size
+    flush()
+    return packets
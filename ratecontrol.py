@@ -0,0 +1,94 @@
+"""Adaptive send rate for one connection.
+
+The rate goes up steadily while the connection looks healthy and is cut
+by a factor as soon as it doesn't (additive increase, multiplicative
+decrease, like TCP): when too many packets go unacknowledged, when the
+round trip time climbs well above the best seen, or when we send more
+bytes per second than the bandwidth budget. It always stays between
+min_rate and max_rate.
+"""
+
+
+class SendRateController:
+    def __init__(self, min_rate=5.0, max_rate=30.0, max_bandwidth=32 * 1024, loss_threshold=0.05,
+                 rtt_tolerance=2.0, rtt_slack=0.05, increase=2.0, decrease=0.75, adapt_interval=0.5):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_bandwidth = max_bandwidth  # Bytes per second
+        self.loss_threshold = loss_threshold
+        self.rtt_tolerance = rtt_tolerance  # Congested once rtt is this many times the best rtt seen...
+        self.rtt_slack = rtt_slack  # ...plus this many seconds, so a few ms of noise on a LAN don't count
+        self.increase = increase  # Sends per second added per second of good conditions
+        self.decrease = decrease  # Rate is multiplied by this on congestion
+        self.adapt_interval = adapt_interval
+        self.rate = max_rate
+
+        self.credit = 0.0
+        self.last_check = None
+        self.last_adapt = None
+        self.sent = 0
+        self.acked = 0
+        self.last_counts = (0, 0, 0, (0, 0))  # sent, acked, bytes out and pings at the last adapt
+        self.stats = {
+            'increases': 0,
+            'decreases': 0,
+            'loss': 0.0,  # Over the last adapt interval
+            'bandwidth': 0.0  # Bytes per second over the last adapt interval
+        }
+
+    def due(self, now):
+        """True if a send fits in the current rate. Call on every tick or frame."""
+        if self.last_check is None:
+            self.last_check = now
+            return True
+        # Up to two sends' worth of credit carries over, so ticks that come a bit early don't skip a send
+        self.credit = min(2.0, self.credit + (now - self.last_check) * self.rate)
+        self.last_check = now
+        if self.credit >= 1.0:
+            self.credit -= 1.0
+            return True
+        return False
+
+    def record_sent(self):
+        self.sent += 1
+
+    def record_ack(self):
+        self.acked += 1
+
+    def adapt(self, now, bytes_out, pings=None, rtt=None, rtt_min=None):
+        """Adjust the rate every adapt_interval seconds.
+
+        bytes_out is the running total sent on the connection. Loss over the
+        interval is worked out from record_sent and record_ack, or, with
+        pings given as running totals of (answered, lost) pings, from those.
+        """
+        if self.last_adapt is None:
+            self.last_adapt = now
+            self.last_counts = (self.sent, self.acked, bytes_out, pings or (0, 0))
+            return
+        elapsed = now - self.last_adapt
+        if elapsed < self.adapt_interval:
+            return
+
+        sent, acked, last_bytes, last_pings = self.last_counts
+        if pings is None:
+            new_sent = self.sent - sent
+            loss = max(0.0, 1 - (self.acked - acked) / new_sent) if new_sent else 0.0
+        else:
+            answered, lost = pings[0] - last_pings[0], pings[1] - last_pings[1]
+            loss = lost / (answered + lost) if answered + lost else 0.0
+        bandwidth = (bytes_out - last_bytes) / elapsed
+        self.last_adapt = now
+        self.last_counts = (self.sent, self.acked, bytes_out, pings or (0, 0))
+        self.stats['loss'] = loss
+        self.stats['bandwidth'] = bandwidth
+
+        congested = (loss > self.loss_threshold or
+                     bandwidth > self.max_bandwidth or
+                     (rtt is not None and rtt_min and rtt > rtt_min * self.rtt_tolerance + self.rtt_slack))
+        if congested:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.stats['decreases'] += 1
+        elif self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.increase * elapsed)
+            self.stats['increases'] += 1
@@ -0,0 +1,158 @@
+"""Reliable, ordered delivery on top of UDP.
+
+Each peer gets a ReliableChannel. Every reliable packet carries a 16 bit
+sequence number plus the newest sequence received from the other side and
+a 32 bit field acking the 32 before it, so one packet that gets through
+acks a whole run of earlier ones. Unacked packets are resent after a
+timeout derived from the measured round trip time, and payloads larger
+than one packet are split into fragments with consecutive sequence numbers
+and joined again before delivery.
+"""
+from collections import deque
+
+SEQUENCE_MODULO = 1 << 16
+ACK_BITS = 32
+FRAGMENT_SIZE = 1024  # Payload bytes per packet, keeps datagrams under the MTU
+MAX_FRAGMENTS = 255
+RECEIVE_WINDOW = 1024  # Ignore sequences this far ahead of the next one to deliver
+SEND_WINDOW = ACK_BITS + 1  # Packets in flight at once, so every one of them fits in an ack
+
+
+def sequence_newer(a, b):
+    """True if sequence a comes after b, allowing for wrap-around."""
+    return a != b and ((a - b) % SEQUENCE_MODULO) < SEQUENCE_MODULO // 2
+
+
+def sequence_distance(newer, older):
+    return (newer - older) % SEQUENCE_MODULO
+
+
+class ReliableChannel:
+    def __init__(self, fragment_size=FRAGMENT_SIZE, min_rto=0.1, max_rto=2.0, initial_rto=0.5):
+        self.fragment_size = fragment_size
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+
+        # Sending
+        self.next_sequence = 0
+        self.queued = deque()  # Fragments not sent yet: (sequence, index, count, payload)
+        self.unacked = {}  # sequence -> [fragment, last sent time, times sent]
+
+        # Round trip time estimate (RFC 6298)
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+
+        # Receiving
+        self.remote_sequence = None  # Newest sequence received
+        self.received = set()  # Recently received sequences, for the ack bitfield
+        self.pending = {}  # sequence -> (index, count, payload) waiting for in-order delivery
+        self.next_delivery = 0
+        self.ack_pending = False  # We owe the peer an ack
+
+        self.stats = {
+            'sent': 0,
+            'resent': 0,
+            'acked': 0,
+            'received': 0,
+            'duplicates': 0,
+            'delivered': 0
+        }
+
+    def send(self, payload):
+        """Queue a payload for reliable delivery, splitting it into fragments if needed."""
+        chunks = [payload[i:i + self.fragment_size] for i in range(0, len(payload), self.fragment_size)] or [b'']
+        if len(chunks) > MAX_FRAGMENTS:
+            raise ValueError(f"Payload of {len(payload)} bytes needs more than {MAX_FRAGMENTS} fragments")
+        for index, chunk in enumerate(chunks):
+            self.queued.append((self.next_sequence, index, len(chunks), bytes(chunk)))
+            self.next_sequence = (self.next_sequence + 1) % SEQUENCE_MODULO
+
+    def poll(self, now):
+        """Return the fragments to put on the wire now: new ones plus any that timed out."""
+        out = []
+        while self.queued:
+            sequence = self.queued[0][0]
+            # unacked keeps insertion order, so its first key is the oldest packet in flight
+            if self.unacked and sequence_distance(sequence, next(iter(self.unacked))) >= SEND_WINDOW:
+                break
+            fragment = self.queued.popleft()
+            self.unacked[sequence] = [fragment, now, 1]
+            out.append(fragment)
+            self.stats['sent'] += 1
+
+        for entry in self.unacked.values():
+            fragment, last_sent, times_sent = entry
+            # Back off exponentially for packets that keep getting lost
+            timeout = min(self.rto * (2 ** (times_sent - 1)), self.max_rto)
+            if now - last_sent >= timeout:
+                entry[1] = now
+                entry[2] += 1
+                self.stats['resent'] += 1
+                out.append(fragment)
+        if out:
+            self.ack_pending = False  # The ack rides along with these
+        return out
+
+    def ack_state(self):
+        """(ack, ack_bits) describing what we've received, to send to the peer."""
+        if self.remote_sequence is None:
+            # Nothing received yet. 0 is a real sequence, so ack the one before the first
+            # we expect instead, which the peer can't have in flight this early.
+            return (self.next_delivery - 1) % SEQUENCE_MODULO, 0
+        bits = 0
+        for i in range(ACK_BITS):
+            if (self.remote_sequence - 1 - i) % SEQUENCE_MODULO in self.received:
+                bits |= 1 << i
+        return self.remote_sequence, bits
+
+    def on_ack(self, ack, ack_bits, now):
+        if not self.unacked:
+            return
+        acked = [ack] + [(ack - 1 - i) % SEQUENCE_MODULO for i in range(ACK_BITS) if ack_bits & (1 << i)]
+        for sequence in acked:
+            entry = self.unacked.pop(sequence, None)
+            if entry is None:
+                continue
+            self.stats['acked'] += 1
+            # Karn's algorithm: resent packets give ambiguous samples, skip them
+            if entry[2] == 1:
+                self._update_rtt(now - entry[1])
+
+    def _update_rtt(self, sample):
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar += (abs(self.srtt - sample) - self.rttvar) * 0.25
+            self.srtt += (sample - self.srtt) * 0.125
+        self.rto = max(self.min_rto, min(self.max_rto, self.srtt + 4 * self.rttvar))
+
+    def receive(self, sequence, index, count, payload):
+        """Take in one fragment. Returns the payloads that are now complete, in order."""
+        self.ack_pending = True
+        if self.remote_sequence is None or sequence_newer(sequence, self.remote_sequence):
+            self.remote_sequence = sequence
+        self.received.add(sequence)
+        if len(self.received) > ACK_BITS * 2:
+            self.received = {s for s in self.received
+                             if sequence_distance(self.remote_sequence, s) <= ACK_BITS}
+
+        if (sequence in self.pending or
+                sequence_newer(self.next_delivery, sequence) or
+                sequence_distance(sequence, self.next_delivery) > RECEIVE_WINDOW):
+            self.stats['duplicates'] += 1
+            return []
+        self.stats['received'] += 1
+        self.pending[sequence] = (index, count, bytes(payload))
+
+        delivered = []
+        while self.next_delivery in self.pending:
+            index, count, _ = self.pending[self.next_delivery]
+            sequences = [(self.next_delivery + i) % SEQUENCE_MODULO for i in range(count - index)]
+            if not all(s in self.pending for s in sequences):
+                break
+            delivered.append(b''.join(self.pending.pop(s)[2] for s in sequences))
+            self.next_delivery = (self.next_delivery + count - index) % SEQUENCE_MODULO
+        self.stats['delivered'] += len(delivered)
+        return delivered
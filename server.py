@@ -0,0 +1,137 @@
+"""Headless dedicated server.
+
+Runs the authoritative simulation (players, enemies, waves and bullets)
+and the network host at a fixed tick rate without opening a window:
+
+    python server.py --port 5555 --tick-rate 30
+"""
+import argparse
+import time
+
+from network import NetworkManager
+from simulation import BULLET_DAMAGE, World
+from snapshot import is_player_id
+
+
+class DedicatedServer:
+    def __init__(self, host='0.0.0.0', port=5555, tick_rate=30, seed=None, stats_file=None, transport=None,
+                 trace_file=None, clock=time.time):
+        self.tick_interval = 1 / tick_rate
+        self.running = False
+        self.world = World(seed=seed)
+
+        self.network = NetworkManager(is_host=True, host=host, port=port, transport=transport,
+                                      trace_path=trace_file, clock=clock)
+        self.report_interval = 10  # Seconds between report() calls
+        self.network.tick_interval = self.tick_interval
+        self.network.on_player_update = self.on_player_update
+        self.network.on_shoot = self.on_shoot
+        self.tracing = bool(trace_file)  # Tick records go in the trace for replays
+        self.network.net_stats.dump_path = stats_file
+
+        self.stats = {
+            'ticks': 0,
+            'tick_time_avg': 0.0,  # Seconds of work per tick, smoothed
+            'tick_time_max': 0.0,
+            'overruns': 0  # Ticks that took longer than tick_interval
+        }
+
+    def on_player_update(self, player_id, position, rotation, timestamp):
+        self.world.players[player_id] = tuple(position)
+
+    def on_shoot(self, message):
+        # Fly the bullet through the time between what the shooter saw and now against the
+        # position history, then hand it to the live simulation from where it has got to
+        now = self.network.clock()
+        view_time = message.get('view_time', now)
+        rewind = now - view_time
+        hit = self.network.lag_compensation.trace(
+            message['position'], message['direction'], view_time, now, exclude=self.world.players)
+        if hit and hit[0] in self.world.enemies:
+            self.world.damage_enemy(hit[0], BULLET_DAMAGE)
+            return
+        bullet = self.world.add_bullet(message['position'], message['direction'], message['player_id'])
+        bullet.position = tuple(p + d * bullet.speed * rewind for p, d in zip(bullet.position, bullet.direction))
+        bullet.birth_time -= rewind
+
+    def tick(self):
+        if self.tracing:
+            self.network.transport.record_tick()
+        self.network.drain_inbox()
+
+        for target_id, amount in self.world.step(self.tick_interval):
+            self.network.send_damage(target_id, amount)
+
+        # Publish enemies next to the players in the snapshots
+        world_state = self.network.world_state
+        for entity_id in list(world_state):
+            if not is_player_id(entity_id) and entity_id not in self.world.enemies:
+                del world_state[entity_id]
+        world_state.update(self.world.entity_states())
+
+        self.network.tick()
+        self.network.flush_reliable()
+        self.network.update_stats()
+
+    def run(self):
+        self.running = True
+        self.network.start()
+        print(f"Dedicated server running at {1 / self.tick_interval:.0f} ticks per second")
+
+        next_tick = time.perf_counter()
+        last_report = time.time()
+        try:
+            while self.running:
+                start = time.perf_counter()
+                self.tick()
+                elapsed = time.perf_counter() - start
+
+                stats = self.stats
+                stats['ticks'] += 1
+                stats['tick_time_avg'] += (elapsed - stats['tick_time_avg']) * 0.05
+                stats['tick_time_max'] = max(stats['tick_time_max'], elapsed)
+
+                next_tick += self.tick_interval
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # Fell behind: start counting again from now instead of running ticks back to back
+                    stats['overruns'] += 1
+                    next_tick = time.perf_counter()
+
+                if time.time() - last_report > self.report_interval:
+                    last_report = time.time()
+                    self.report()
+        finally:
+            self.stop()
+
+    def report(self):
+        print(f"Players: {len(self.network.clients)}, enemies: {len(self.world.enemies)}, "
+              f"wave: {self.world.wave - 1}, tick: {self.stats['tick_time_avg'] * 1000:.2f} ms avg")
+    
+    def stop(self):
+        if self.network.running:
+            self.network.stop()
+        self.running = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a headless dedicated server')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to bind to')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--tick-rate', type=int, default=30, help='Simulation and network ticks per second')
+    parser.add_argument('--stats-file', help='Append network stats to this JSON lines file every 5 seconds')
+    parser.add_argument('--trace', help='Record every datagram to this file for replay with nettrace.py')
+    args = parser.parse_args()
+
+    server = DedicatedServer(host=args.host, port=args.port, tick_rate=args.tick_rate, stats_file=args.stats_file,
+                             trace_file=args.trace)
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        print("Server stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Authoritative game simulation without Ursina, used by the dedicated server.
+
+Mirrors the rules of the Enemy, Boss, Bullet and spawn_wave code in main.py
+on plain tuples so it can run on a machine with no window or GPU.
+"""
+import math
+import random
+
+from collision import CollisionWorld, box_from_center
+from spatial_hash import SpatialHash
+
+ENEMY_PREFIX = 'E'
+BOSS_PREFIX = 'B'
+
+ENEMY_STATS = {
+    False: {'health': 30, 'speed': 2, 'damage': 10, 'attack_cooldown': 1.0},
+    True: {'health': 200, 'speed': 1.5, 'damage': 20, 'attack_cooldown': 2.0},  # Boss
+}
+ATTACK_RANGE = 2
+HIT_RADIUS = 1.5
+BULLET_SPEED = 50
+BULLET_DAMAGE = 10
+BULLET_LIFETIME = 5.0
+FIRST_WAVE_SIZE = 5
+BOSS_EVERY = 3  # Every third wave brings a boss
+SPAWN_LIMIT = 45
+# Static level geometry as (center, size) boxes: the floor and the four arena walls
+FLOOR = ((0, -0.5, 0), (100, 1, 100))
+WALLS = [
+    ((0, 5, -50), (100, 10, 1)), ((0, 5, 50), (100, 10, 1)),  # Front and back walls
+    ((-50, 5, 0), (1, 10, 100)), ((50, 5, 0), (1, 10, 100)),  # Left and right walls
+]
+
+
+def _distance(a, b):
+    return math.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2)
+
+
+class SimEnemy:
+    def __init__(self, enemy_id, position, is_boss=False):
+        stats = ENEMY_STATS[is_boss]
+        self.enemy_id = enemy_id
+        self.position = tuple(position)
+        self.yaw = 0.0
+        self.is_boss = is_boss
+        self.health = stats['health']
+        self.speed = stats['speed']
+        self.damage = stats['damage']
+        self.attack_cooldown = stats['attack_cooldown']
+        self.last_attack = 0
+
+    def step(self, dt, players, now):
+        """Chase the closest player. Returns the id of the player attacked this step, if any."""
+        if not players:
+            return None
+        target_id, target = min(players.items(), key=lambda item: _distance(item[1], self.position))
+
+        dx = target[0] - self.position[0]
+        dz = target[2] - self.position[2]
+        length = math.hypot(dx, dz)
+        if length > 0:
+            # Like look_at with rotation_x/z zeroed: turn to face the player, move along the ground
+            self.yaw = math.degrees(math.atan2(dx, dz))
+            step = min(self.speed * dt, length)
+            self.position = (self.position[0] + dx / length * step, self.position[1],
+                             self.position[2] + dz / length * step)
+
+        if _distance(target, self.position) < ATTACK_RANGE and now - self.last_attack > self.attack_cooldown:
+            self.last_attack = now
+            return target_id
+        return None
+
+
+class SimBullet:
+    def __init__(self, position, direction, owner_id, birth_time, speed=BULLET_SPEED, damage=BULLET_DAMAGE):
+        length = math.sqrt(sum(v * v for v in direction)) or 1
+        self.position = tuple(position)
+        self.direction = tuple(v / length for v in direction)
+        self.owner_id = owner_id
+        self.birth_time = birth_time
+        self.speed = speed
+        self.damage = damage
+
+
+class World:
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+        self.time = 0.0
+        self.players = {}  # player id -> position
+        self.enemies = {}  # enemy id -> SimEnemy
+        self.bullets = []
+        self.wave = 1
+        self.enemies_per_wave = FIRST_WAVE_SIZE
+        self.next_enemy = 0
+        self.enemy_grid = SpatialHash()  # Kept in step with enemy positions for bullet queries
+        self.collision = CollisionWorld()
+        for center, size in [FLOOR] + WALLS:
+            self.collision.add_static(*box_from_center(center, size))
+
+    def spawn_enemy(self, is_boss=False):
+        # Random spot 15-30 units from a random player, inside the walls
+        center = self.random.choice(list(self.players.values())) if self.players else (0, 0, 0)
+        angle = self.random.uniform(0, 6.28)
+        distance = self.random.uniform(15, 30)
+        x = max(-SPAWN_LIMIT, min(SPAWN_LIMIT, center[0] + math.cos(angle) * distance))
+        z = max(-SPAWN_LIMIT, min(SPAWN_LIMIT, center[2] + math.sin(angle) * distance))
+
+        enemy_id = f"{BOSS_PREFIX if is_boss else ENEMY_PREFIX}{self.next_enemy:03d}"
+        self.next_enemy = (self.next_enemy + 1) % 1000
+        enemy = SimEnemy(enemy_id, (x, 0, z), is_boss)
+        self.enemies[enemy_id] = enemy
+        self.enemy_grid.insert(enemy, enemy.position)
+        return enemy
+
+    def spawn_wave(self):
+        for _ in range(self.enemies_per_wave):
+            self.spawn_enemy()
+        if self.wave > 0 and self.wave % BOSS_EVERY == 0:
+            self.spawn_enemy(is_boss=True)
+        self.wave += 1
+        self.enemies_per_wave += 1
+
+    def add_bullet(self, position, direction, owner_id, damage=BULLET_DAMAGE):
+        bullet = SimBullet(position, direction, owner_id, self.time, damage=damage)
+        self.bullets.append(bullet)
+        return bullet
+
+    def damage_enemy(self, enemy_id, amount):
+        """Returns True if the enemy died."""
+        enemy = self.enemies.get(enemy_id)
+        if enemy is None:
+            return False
+        enemy.health -= amount
+        if enemy.health <= 0:
+            del self.enemies[enemy_id]
+            self.enemy_grid.remove(enemy)
+            return True
+        return False
+
+    def step(self, dt):
+        """Advance the world by dt seconds. Returns (player id, damage) for every enemy attack."""
+        self.time += dt
+        attacks = []
+
+        for enemy in list(self.enemies.values()):
+            target_id = enemy.step(dt, self.players, self.time)
+            self.enemy_grid.update(enemy, enemy.position)
+            if target_id is not None:
+                attacks.append((target_id, enemy.damage))
+
+        alive = []
+        for bullet in self.bullets:
+            start = bullet.position
+            bullet.position = tuple(p + d * bullet.speed * dt for p, d in zip(start, bullet.direction))
+            if self.time - bullet.birth_time > BULLET_LIFETIME:
+                continue
+            # Test the whole path of this step so fast bullets can't skip past an enemy,
+            # against only the enemies in the grid cells around that path
+            hit = self.collision.sweep(start, bullet.position, [
+                (enemy, enemy.position, HIT_RADIUS)
+                for enemy in self.enemy_grid.query_segment(start, bullet.position, HIT_RADIUS)])
+            if hit is None:
+                alive.append(bullet)
+            elif isinstance(hit[1], SimEnemy):
+                self.damage_enemy(hit[1].enemy_id, bullet.damage)
+        self.bullets = alive
+
+        # Next wave once the current one is cleared and someone is around to fight it
+        if not self.enemies and self.players:
+            self.spawn_wave()
+        return attacks
+
+    def entity_states(self):
+        """Enemy states in the six float layout used by snapshots."""
+        return {
+            enemy_id: enemy.position + (0.0, enemy.yaw, 0.0)
+            for enemy_id, enemy in self.enemies.items()
+        }
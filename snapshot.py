@@ -0,0 +1,129 @@
+"""Delta-compressed world snapshots.
+
+A snapshot maps an entity id (a player, or an enemy simulated by the host)
+to a tuple of six floats: position x, y, z followed by rotation x, y, z.
+The host keeps one SnapshotEncoder per client and only sends the fields
+that changed since the last snapshot that client acknowledged. The client
+keeps a SnapshotDecoder that rebuilds full snapshots from those deltas.
+"""
+
+FIELD_COUNT = 6  # position xyz + rotation xyz
+FULL_MASK = (1 << FIELD_COUNT) - 1
+REMOVED_MASK = 0  # An entry with no fields means the entity is gone
+NO_BASELINE = 0  # Sequence numbers start at 1, 0 means "full snapshot"
+
+
+def is_player_id(entity_id):
+    """Player ids are digits, anything else the host simulates (enemies) uses a letter prefix."""
+    return entity_id.isdigit()
+
+
+def make_state(position, rotation):
+    return tuple(float(v) for v in position) + tuple(float(v) for v in rotation)
+
+
+def diff_state(baseline, state, epsilon):
+    """Return (mask, values) for the fields of state that differ from baseline."""
+    mask = 0
+    values = []
+    for i in range(FIELD_COUNT):
+        if baseline is None or abs(state[i] - baseline[i]) > epsilon:
+            mask |= 1 << i
+            values.append(state[i])
+    return mask, tuple(values)
+
+
+def apply_delta(baseline, mask, values):
+    """Rebuild a full state from a baseline and the (mask, values) of a delta."""
+    state = list(baseline) if baseline is not None else [0.0] * FIELD_COUNT
+    it = iter(values)
+    for i in range(FIELD_COUNT):
+        if mask & (1 << i):
+            state[i] = next(it)
+    return tuple(state)
+
+
+class SnapshotEncoder:
+    """Host side delta encoder for one client."""
+
+    def __init__(self, ring_size=32, epsilon=1e-3):
+        self.ring_size = ring_size
+        self.epsilon = epsilon
+        self.sequence = NO_BASELINE
+        self.sent = {}  # seq -> snapshot as the client will rebuild it
+        self.acked_sequence = NO_BASELINE
+
+    def ack(self, sequence):
+        # Acks can arrive out of order, only ever move the baseline forward
+        if sequence in self.sent and sequence > self.acked_sequence:
+            self.acked_sequence = sequence
+
+    def baseline(self):
+        return self.sent.get(self.acked_sequence)
+
+    def encode(self, world, held=()):
+        """Encode a {entity_id: state} snapshot.
+
+        Returns (sequence, baseline_sequence, entries) where entries maps an
+        entity id to the (mask, values) pair that has to go on the wire.
+        Falls back to a full snapshot when nothing has been acked yet or the
+        acked baseline has dropped out of the ring. Entities in held keep
+        their baseline state on the client and are left out of this snapshot.
+        """
+        baseline = self.baseline()
+        baseline_sequence = self.acked_sequence if baseline is not None else NO_BASELINE
+
+        entries = {}
+        rebuilt = {}
+        for entity_id, state in world.items():
+            previous = baseline.get(entity_id) if baseline is not None else None
+            if entity_id in held and previous is not None:
+                rebuilt[entity_id] = previous
+                continue
+            mask, values = diff_state(previous, state, self.epsilon)
+            if mask:
+                entries[entity_id] = (mask, values)
+            rebuilt[entity_id] = apply_delta(previous, mask, values)
+        if baseline is not None:
+            for entity_id in baseline:
+                if entity_id not in world:
+                    entries[entity_id] = (REMOVED_MASK, ())
+
+        self.sequence += 1
+        self.sent[self.sequence] = rebuilt
+        self.sent.pop(self.sequence - self.ring_size, None)
+        return self.sequence, baseline_sequence, entries
+
+
+class SnapshotDecoder:
+    """Client side decoder that rebuilds full snapshots from deltas."""
+
+    def __init__(self, ring_size=32):
+        self.ring_size = ring_size
+        self.received = {}  # seq -> full snapshot
+        self.latest_sequence = NO_BASELINE
+
+    def decode(self, sequence, baseline_sequence, entries):
+        """Return the full snapshot, or None if it is out of date or its baseline is unknown."""
+        if sequence <= self.latest_sequence:
+            return None
+
+        if baseline_sequence == NO_BASELINE:
+            baseline = {}
+        elif baseline_sequence in self.received:
+            baseline = self.received[baseline_sequence]
+        else:
+            return None
+
+        snapshot = dict(baseline)
+        for entity_id, (mask, values) in entries.items():
+            if mask == REMOVED_MASK:
+                snapshot.pop(entity_id, None)
+            else:
+                snapshot[entity_id] = apply_delta(baseline.get(entity_id), mask, values)
+
+        self.received[sequence] = snapshot
+        self.latest_sequence = sequence
+        for old in [s for s in self.received if s <= sequence - self.ring_size]:
+            del self.received[old]
+        return snapshot
@@ -0,0 +1,93 @@
+"""Uniform spatial hash over the arena floor.
+
+Objects are bucketed by the (x, z) cell they stand in, so finding what is
+near a point or a bullet's path only looks at a few cells instead of every
+object. Objects are tracked by identity; update() only touches the buckets
+when an object actually crosses into another cell, which for enemies
+walking a couple of units per second is rare.
+
+Nothing here is specific to enemies. Queries take a padding for the radius
+of whatever is being looked for, so the same grid serves bullets, enemy AI
+looking for neighbours, or pickups looking for players.
+"""
+import math
+
+DEFAULT_CELL_SIZE = 5.0
+
+
+class SpatialHash:
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (cell x, cell z) -> {id: object}
+        self.object_cells = {}  # id -> cell the object is in
+
+    def __len__(self):
+        return len(self.object_cells)
+
+    def cell(self, position):
+        return (math.floor(position[0] / self.cell_size), math.floor(position[2] / self.cell_size))
+
+    def insert(self, obj, position):
+        """Add obj at position, or move it there if it's already in the grid."""
+        self.update(obj, position)
+
+    def update(self, obj, position):
+        key = id(obj)
+        cell = self.cell(position)
+        old_cell = self.object_cells.get(key)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            self._remove_from_cell(key, old_cell)
+        self.cells.setdefault(cell, {})[key] = obj
+        self.object_cells[key] = cell
+
+    def remove(self, obj):
+        cell = self.object_cells.pop(id(obj), None)
+        if cell is not None:
+            self._remove_from_cell(id(obj), cell)
+
+    def clear(self):
+        self.cells = {}
+        self.object_cells = {}
+
+    def query_box(self, min_x, min_z, max_x, max_z):
+        """Objects in every cell touched by the rectangle. Callers do the exact test."""
+        size = self.cell_size
+        x0, x1 = math.floor(min_x / size), math.floor(max_x / size)
+        z0, z1 = math.floor(min_z / size), math.floor(max_z / size)
+        cells = self.cells
+        found = []
+        if (x1 - x0 + 1) * (z1 - z0 + 1) > len(cells):
+            # Bigger than the populated part of the grid: walk the occupied cells instead
+            for (x, z), bucket in cells.items():
+                if x0 <= x <= x1 and z0 <= z <= z1:
+                    found.extend(bucket.values())
+            return found
+        for x in range(x0, x1 + 1):
+            for z in range(z0, z1 + 1):
+                bucket = cells.get((x, z))
+                if bucket:
+                    found.extend(bucket.values())
+        return found
+
+    def query_radius(self, position, radius):
+        """Candidates within radius of position (by cell, not exact distance)."""
+        return self.query_box(position[0] - radius, position[2] - radius,
+                              position[0] + radius, position[2] + radius)
+
+    def query_segment(self, start, end, padding=0.0):
+        """Candidates near the segment start-end, padded by the largest radius that counts as a hit.
+
+        Uses the cells under the segment's bounding rectangle, which for the
+        short paths bullets cover in one step is one to four cells.
+        """
+        return self.query_box(min(start[0], end[0]) - padding, min(start[2], end[2]) - padding,
+                              max(start[0], end[0]) + padding, max(start[2], end[2]) + padding)
+
+    def _remove_from_cell(self, key, cell):
+        bucket = self.cells.get(cell)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self.cells[cell]
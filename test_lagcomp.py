@@ -0,0 +1,34 @@
+"""Damage claim checks for lagcomp.py.
+
+    python -m unittest test_lagcomp
+"""
+import unittest
+
+from lagcomp import LagCompensator
+
+
+class ValidateDamageTest(unittest.TestCase):
+    def setUp(self):
+        # A target standing 5 units in front of the shooter for the last half second
+        self.lag = LagCompensator()
+        for i in range(16):
+            self.lag.record(100.0 + i / 30, {'2': (5.0, 1.0, 0.0)})
+        self.now = 100.5
+        self.lag.add_shot('1', (0.0, 1.0, 0.0), (1.0, 0.0, 0.0), self.now - 0.05, rtt=0.0)
+
+    def test_shot_backs_up_one_claim(self):
+        self.assertTrue(self.lag.validate_damage('1', '2', 15, self.now))
+        self.assertFalse(self.lag.validate_damage('1', '2', 15, self.now))
+
+    def test_claim_above_max_damage_rejected(self):
+        self.assertFalse(self.lag.validate_damage('1', '2', self.lag.max_damage + 1, self.now))
+        # The shot wasn't used up by the rejected claim
+        self.assertTrue(self.lag.validate_damage('1', '2', self.lag.max_damage, self.now))
+
+    def test_shot_that_misses_backs_up_nothing(self):
+        self.lag.record(self.now, {'2': (5.0, 1.0, 0.0), '3': (0.0, 1.0, 5.0)})
+        self.assertFalse(self.lag.validate_damage('1', '3', 10, self.now))
+
+
+if __name__ == '__main__':
+    unittest.main()
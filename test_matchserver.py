@@ -0,0 +1,67 @@
+"""Join handling checks for matchserver.py, with room creation faked out.
+
+    python -m unittest test_matchserver
+"""
+import threading
+import time
+import unittest
+from unittest import mock
+
+import protocol
+from matchserver import MatchServer
+
+CLIENT_ADDR = ('127.0.0.1', 40000)
+
+
+class JoinTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MatchServer(host='127.0.0.1', port=0, max_rooms=1)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.server.stop()
+
+    def slow_create_room(self, room_id=None):
+        # Spawning a worker takes a while; stand in for it with a wait
+        self.release.wait(5)
+        with self.server.lock:
+            if len(self.server.rooms) >= self.server.max_rooms:
+                return None
+            self.server.rooms[room_id] = mock.Mock(last_active=0.0)
+        return room_id
+
+    def join(self, room_id, addr=CLIENT_ADDR):
+        data = protocol.encode({'type': 'join', 'room': room_id}, protocol.PROTOCOL_VERSION)
+        started = time.perf_counter()
+        self.server._on_datagrams([(data, addr)])
+        return time.perf_counter() - started
+
+    def wait_for_opener(self):
+        deadline = time.time() + 5
+        while self.server.opening and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_join_doesnt_wait_for_the_room_to_open(self):
+        with mock.patch.object(self.server, 'create_room', self.slow_create_room):
+            self.server.start()
+            self.assertLess(self.join(7), 0.5)
+            self.assertEqual(self.server.routes[CLIENT_ADDR], 7)
+            self.release.set()
+            self.wait_for_opener()
+        self.assertIn(7, self.server.rooms)
+        self.assertEqual(self.server.routes[CLIENT_ADDR], 7)
+
+    def test_join_rejected_when_the_room_cant_open(self):
+        self.server.rooms[1] = mock.Mock(last_active=0.0)
+        self.release.set()
+        with mock.patch.object(self.server, 'create_room', self.slow_create_room):
+            self.server.start()
+            self.join(2)
+            self.wait_for_opener()
+        self.assertNotIn(CLIENT_ADDR, self.server.routes)
+        self.assertEqual(self.server.stats['rejected_joins'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""The game's side of multiplayer messages.
+
+Needs ursina and a window to open, and is skipped without them.
+
+    python -m unittest test_multiplayer
+"""
+import unittest
+
+import protocol
+
+try:
+    import main
+except Exception as e:  # ursina missing, or no display to open the window on
+    main = None
+    skip_reason = f"can't start the game here: {e}"
+else:
+    skip_reason = ''
+
+SERVER_ADDR = ('127.0.0.1', 5555)
+
+
+@unittest.skipIf(main is None, skip_reason)
+class ServerDamageTest(unittest.TestCase):
+    def setUp(self):
+        main.menu.start_multiplayer(is_host=False, host=SERVER_ADDR[0], port=SERVER_ADDR[1])
+        self.network_manager = main.menu.network_manager
+
+    def tearDown(self):
+        main.menu.back_to_main()
+
+    def test_enemy_damage_from_server_hurts_local_player(self):
+        self.assertEqual(main.player.player_id, self.network_manager.player_id)
+        health = main.player.health
+
+        # What a dedicated server sends when one of its enemies hits this client
+        datagram = protocol.encode({'type': 'damage', 'from_player': 'E001',
+                                    'target_id': self.network_manager.player_id, 'amount': 10},
+                                   self.network_manager.protocol_version)
+        self.network_manager._on_datagrams([(datagram, SERVER_ADDR)])
+        self.network_manager.drain_inbox()
+
+        self.assertEqual(main.player.health, health - 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Host snapshot checks for network.py, run against an in-memory transport.
+
+    python -m unittest test_network
+"""
+import unittest
+
+import interest
+import protocol
+from network import NetworkManager
+from snapshot import make_state
+
+CLIENT_ADDR = ('127.0.0.1', 40000)
+
+
+class MemoryTransport:
+    """Keeps what the host sends instead of putting it on a socket."""
+
+    def __init__(self):
+        self.sent = []
+        self.stats = {}
+
+    def start(self, on_datagrams):
+        pass
+
+    def sendto(self, data, addr):
+        self.sent.append((bytes(data), addr))
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class FarEntityCadenceTest(unittest.TestCase):
+    def run_host(self, send_rate, snapshots=300):
+        """Tick a host at 30 Hz for a client limited to send_rate, and count updates per far entity."""
+        transport = MemoryTransport()
+        clock = [1000.0]
+        host = NetworkManager(is_host=True, transport=transport, clock=lambda: clock[0])
+        host._handle_connect({'player_id': '1', 'min_version': protocol.MIN_PROTOCOL_VERSION,
+                              'max_version': protocol.PROTOCOL_VERSION}, CLIENT_ADDR)
+        rate = host.send_rates['1']
+        rate.min_rate = rate.max_rate = rate.rate = send_rate
+
+        # The viewer in the middle, far entities three to five cells out
+        far_ids = [f'E{i:03d}' for i in range(12)]
+        updates = dict.fromkeys(far_ids, 0)
+        sent_snapshots = 0
+        tick = 0
+        while sent_snapshots < snapshots:
+            tick += 1
+            clock[0] += host.tick_interval
+            host.world_state['1'] = make_state((0.0, 0.0, 0.0), (0.0, 0.0, 0.0))
+            for i, entity_id in enumerate(far_ids):
+                # Moves a little every tick, so every update it's given shows up in the delta
+                host.world_state[entity_id] = make_state((35.0 + i, 0.0, 2.0 + (tick % 5) * 0.1), (0, 0, 0))
+            transport.sent.clear()
+            host.tick()
+            for data, addr in transport.sent:
+                for message in protocol.decode_datagram(data):
+                    if message['type'] != 'snapshot':
+                        continue
+                    sent_snapshots += 1
+                    for entity_id in message['entries']:
+                        if entity_id in updates:
+                            updates[entity_id] += 1
+                    host._handle_snapshot_ack({'sequence': message['sequence']}, addr)
+        self.assertTrue(all(host.interest.relevance('1', entity_id) == interest.FAR for entity_id in far_ids))
+        return updates, sent_snapshots
+
+    def assert_every_far_entity_updated(self, send_rate):
+        updates, sent_snapshots = self.run_host(send_rate)
+        interval = interest.InterestGrid().far_interval
+        for entity_id, count in updates.items():
+            # Each one gets its turn, give or take the full snapshots while nothing was acked
+            self.assertGreaterEqual(count, sent_snapshots // interval - 2, entity_id)
+
+    def test_at_tick_rate(self):
+        self.assert_every_far_entity_updated(30.0)
+
+    def test_below_tick_rate(self):
+        self.assert_every_far_entity_updated(10.0)
+        self.assert_every_far_entity_updated(5.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Round-trip error checks for quantize.py and the quantized protocol messages.
+
+    python -m unittest test_quantize
+"""
+import math
+import random
+import unittest
+
+import protocol
+from quantize import Quantizer
+
+
+def random_unit_vector(rng):
+    while True:
+        v = [rng.uniform(-1, 1) for _ in range(3)]
+        length = math.sqrt(sum(x * x for x in v))
+        if length > 1e-6:
+            return [x / length for x in v]
+
+
+def angle_between(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    return math.degrees(math.acos(max(-1.0, min(1.0, dot))))
+
+
+def angle_difference(a, b):
+    return abs((a - b + 180) % 360 - 180)
+
+
+class QuantizerTest(unittest.TestCase):
+    def setUp(self):
+        self.q = Quantizer()
+        self.rng = random.Random(1234)
+
+    def test_position_round_trip(self):
+        for _ in range(10000):
+            value = self.rng.uniform(-50, 50)
+            self.assertLessEqual(abs(self.q.unposition(self.q.position(value)) - value),
+                                 self.q.position_error + 1e-9)
+
+    def test_position_bounds_are_exact_and_clamped(self):
+        self.assertEqual(self.q.unposition(self.q.position(-50)), -50)
+        self.assertEqual(self.q.unposition(self.q.position(50)), 50)
+        self.assertEqual(self.q.unposition(self.q.position(80)), 50)
+        self.assertEqual(self.q.unposition(self.q.position(-80)), -50)
+
+    def test_angle_round_trip(self):
+        for _ in range(10000):
+            degrees = self.rng.uniform(-720, 720)
+            self.assertLessEqual(angle_difference(self.q.unangle(self.q.angle(degrees)), degrees),
+                                 self.q.angle_error + 1e-9)
+
+    def test_angle_wraps(self):
+        self.assertEqual(self.q.angle(360), self.q.angle(0))
+        self.assertAlmostEqual(self.q.unangle(self.q.angle(-90)), 270)
+        self.assertEqual(self.q.angle(359.9999), 0)
+
+    def test_normal_round_trip(self):
+        for _ in range(10000):
+            v = random_unit_vector(self.rng)
+            self.assertLess(angle_between(v, self.q.unnormal(self.q.normal(v))), 0.01)
+
+    def test_normal_axes_and_unnormalized_input(self):
+        for v in [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]:
+            self.assertLess(angle_between(v, self.q.unnormal(self.q.normal(v))), 0.01)
+        self.assertLess(angle_between((0.6, 0, 0.8), self.q.unnormal(self.q.normal((3, 0, 4)))), 0.01)
+
+    def test_fewer_bits_mean_more_error(self):
+        coarse = Quantizer(position_bits=8, angle_bits=8)
+        self.assertGreater(coarse.position_error, self.q.position_error)
+        self.assertLessEqual(abs(coarse.unposition(coarse.position(12.34)) - 12.34), coarse.position_error + 1e-9)
+
+    def test_rejects_more_than_16_bits(self):
+        with self.assertRaises(ValueError):
+            Quantizer(position_bits=24)
+
+    def test_rejects_each_bit_count_out_of_range(self):
+        for bits in ({'position_bits': 0}, {'angle_bits': 0}, {'normal_bits': 0}, {'normal_bits': 17}):
+            with self.assertRaises(ValueError):
+                Quantizer(**bits)
+
+
+class QuantizedProtocolTest(unittest.TestCase):
+    version = protocol.QUANTIZED_VERSION
+
+    def test_player_update(self):
+        message = {'type': 'player_update', 'player_id': '1234',
+                   'position': (12.5, 1.25, -33.3), 'rotation': (-10.0, 200.0, 0.0)}
+        data = protocol.encode(message, self.version)
+        self.assertLess(len(data), len(protocol.encode(message, 1)))
+        decoded = protocol.decode(data)
+        self.assertEqual(decoded['player_id'], '1234')
+        for a, b in zip(decoded['position'], message['position']):
+            self.assertLessEqual(abs(a - b), protocol.QUANTIZER.position_error + 1e-9)
+        for a, b in zip(decoded['rotation'], message['rotation']):
+            self.assertLessEqual(angle_difference(a, b), protocol.QUANTIZER.angle_error + 1e-9)
+
+    def test_shoot(self):
+        message = {'type': 'shoot', 'player_id': '42', 'position': (0.0, 1.5, 0.0), 'direction': (0.0, -0.6, -0.8)}
+        decoded = protocol.decode(protocol.encode(message, self.version))
+        self.assertLess(angle_between(decoded['direction'], message['direction']), 0.01)
+
+    def test_snapshot_partial_fields(self):
+        entries = {'1234': (0b101001, (3.0, 45.0, 7.5)), 'E001': (0b000110, (0.0, -20.0)), '9': (0, ())}
+        message = {'type': 'snapshot', 'sequence': 7, 'baseline': 5, 'host_time': 1.5, 'entries': entries}
+        decoded = protocol.decode(protocol.encode(message, self.version))
+        self.assertEqual(set(decoded['entries']), set(entries))
+        # Field 0 is a position, fields 3 and 5 are rotations
+        mask, values = decoded['entries']['1234']
+        self.assertEqual(mask, 0b101001)
+        self.assertAlmostEqual(values[0], 3.0, delta=protocol.QUANTIZER.position_error)
+        self.assertAlmostEqual(values[1], 45.0, delta=protocol.QUANTIZER.angle_error)
+        self.assertAlmostEqual(values[2], 7.5, delta=protocol.QUANTIZER.angle_error)
+        self.assertEqual(decoded['entries']['9'], (0, ()))
+
+    def test_older_version_still_uses_floats(self):
+        message = {'type': 'player_update', 'player_id': '1', 'position': (1.1, 2.2, 3.3), 'rotation': (0, 0, 0)}
+        decoded = protocol.decode(protocol.encode(message, 1))
+        self.assertEqual(decoded['version'], 1)
+        self.assertAlmostEqual(decoded['position'][0], 1.1, places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
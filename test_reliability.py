@@ -0,0 +1,59 @@
+"""Delivery checks for reliability.py over a lossy simulated link.
+
+    python -m unittest test_reliability
+"""
+import unittest
+
+from reliability import ReliableChannel
+
+
+def deliver(fragments, channel, sender, now):
+    """Hand fragments to channel with sender's acks on them, like NetworkManager does."""
+    ack, ack_bits = sender.ack_state()
+    delivered = []
+    for sequence, index, count, payload in fragments:
+        channel.on_ack(ack, ack_bits, now)
+        delivered.extend(channel.receive(sequence, index, count, payload))
+    return delivered
+
+
+class ReliableChannelTest(unittest.TestCase):
+    def test_nothing_received_acks_nothing(self):
+        host, client = ReliableChannel(), ReliableChannel()
+        host.send(b'connect_ack')
+        host.poll(0.0)
+        ack, ack_bits = client.ack_state()
+        host.on_ack(ack, ack_bits, 0.0)
+        self.assertIn(0, host.unacked)
+
+    def test_first_flight_lost(self):
+        host, client = ReliableChannel(), ReliableChannel()
+        client.send(b'connect')
+        deliver(client.poll(0.0), host, client, 0.0)
+
+        # The host's first flight, sequences 0 and 1, never arrives
+        host.send(b'connect_ack')
+        host.send(b'game_state')
+        host.poll(0.01)
+
+        # The client resends connect before hearing anything back
+        delivered = deliver(client.poll(1.0), host, client, 1.0)
+        self.assertEqual(delivered, [])
+        self.assertEqual(set(host.unacked), {0, 1})
+
+        # The host times out and resends, and the client gets both in order
+        now = 1.0 + host.rto
+        self.assertEqual(deliver(host.poll(now), client, host, now), [b'connect_ack', b'game_state'])
+        host.send(b'damage')
+        self.assertEqual(deliver(host.poll(now), client, host, now), [b'damage'])
+
+    def test_fragments_join_in_order(self):
+        sender, receiver = ReliableChannel(fragment_size=4), ReliableChannel()
+        sender.send(b'0123456789')
+        fragments = sender.poll(0.0)
+        self.assertEqual(len(fragments), 3)
+        self.assertEqual(deliver(fragments[::-1], receiver, sender, 0.0), [b'0123456789'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+"""Restarting a game must not leave the last game's entities behind.
+
+Needs ursina and a window to open, and is skipped without them.
+
+    python -m unittest test_restart
+"""
+import unittest
+
+try:
+    import main
+    from ursina import scene
+except Exception as e:  # ursina missing, or no display to open the window on
+    main = None
+    skip_reason = f"can't start the game here: {e}"
+else:
+    skip_reason = ''
+
+
+@unittest.skipIf(main is None, skip_reason)
+class RestartTest(unittest.TestCase):
+    def counts(self):
+        return len(scene.entities), len(scene.collidables)
+
+    def test_entity_counts_stay_flat(self):
+        main.menu.restart_game()
+        counts = self.counts()
+        for _ in range(3):
+            # Leave a powerup and a damaged player behind, like a game cut short
+            main.powerups.append(main.Powerup((3, 1, 3), 'health'))
+            main.player.take_damage(10)
+            main.menu.restart_game()
+            self.assertEqual(self.counts(), counts)
+
+    def test_camera_survives_restart(self):
+        main.menu.restart_game()
+        main.menu.restart_game()
+        self.assertTrue(main.camera.has_ancestor(main.player))
+
+
+if __name__ == '__main__':
+    unittest.main()
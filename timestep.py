@@ -0,0 +1,45 @@
+"""Fixed-rate simulation clock.
+
+Frames add their real duration to an accumulator and the simulation is
+stepped in whole fixed steps out of it, so gameplay runs at the same rate
+whatever the frame rate is. What's left over is the fraction of a step the
+renderer should interpolate by. A frame never runs more than max_steps
+steps: after a long stall the extra time is dropped instead of making the
+next frame even slower (the "spiral of death").
+"""
+DEFAULT_STEP = 1 / 60
+DEFAULT_MAX_STEPS = 5
+
+
+class FixedTimestep:
+    def __init__(self, step=DEFAULT_STEP, max_steps=DEFAULT_MAX_STEPS):
+        self.step = step
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.time = 0.0  # Simulated seconds so far
+        self.stats = {
+            'frames': 0,
+            'steps': 0,
+            'clamped_frames': 0,  # Frames that hit max_steps
+            'dropped_time': 0.0  # Seconds of simulation skipped to catch up
+        }
+
+    def advance(self, frame_dt):
+        """Add one frame's real time. Returns how many fixed steps to run this frame."""
+        self.accumulator += max(0.0, frame_dt)
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_steps:
+            self.stats['clamped_frames'] += 1
+            self.stats['dropped_time'] += (steps - self.max_steps) * self.step
+            self.accumulator -= (steps - self.max_steps) * self.step
+            steps = self.max_steps
+        self.accumulator -= steps * self.step
+        self.time += steps * self.step
+        self.stats['frames'] += 1
+        self.stats['steps'] += steps
+        return steps
+
+    @property
+    def alpha(self):
+        """How far between the previous and the latest step to draw, 0 to 1."""
+        return min(1.0, self.accumulator / self.step)
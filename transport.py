@@ -0,0 +1,110 @@
+"""Event-driven UDP transport.
+
+A single background thread waits on a selector and, each time the socket is
+readable, drains every datagram that is ready with recvfrom_into into one
+preallocated buffer, packed one after another. A socketpair registered with the same selector lets
+close() wake the thread straight away instead of waiting for a timeout.
+"""
+import selectors
+import socket
+import threading
+
+import protocol
+
+MAX_DATAGRAM = 65535
+
+
+class UDPTransport:
+    def __init__(self, address, buffer_count=64, buffer_size=protocol.DEFAULT_MTU):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(address)
+        self.socket.setblocking(False)
+
+        # Room for buffer_count datagrams of the size the protocol sends, plus one of the
+        # largest size UDP allows so an oversized one (a big snapshot) is never cut short
+        self.buffer = bytearray(buffer_count * buffer_size + MAX_DATAGRAM)
+        self.view = memoryview(self.buffer)
+
+        self.selector = selectors.DefaultSelector()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self.selector.register(self.socket, selectors.EVENT_READ)
+        self.selector.register(self._wake_reader, selectors.EVENT_READ)
+
+        self.running = False
+        self.thread = None
+        self.on_datagrams = None
+        self.stats = {
+            'wakeups': 0,  # Times the selector returned with the socket readable
+            'datagrams': 0,
+            'max_batch': 0  # Most datagrams handed over in one call
+        }
+
+    @property
+    def address(self):
+        return self.socket.getsockname()
+
+    def start(self, on_datagrams):
+        """Start receiving. on_datagrams gets a list of (memoryview, addr) pairs.
+
+        The views point into a buffer that is reused for the next batch, so
+        they must be decoded or copied before on_datagrams returns.
+        """
+        self.on_datagrams = on_datagrams
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def sendto(self, data, addr):
+        try:
+            return self.socket.sendto(data, addr)
+        except BlockingIOError:
+            return 0  # Send buffer full, drop it like the network would
+
+    def close(self):
+        self.running = False
+        try:
+            self._wake_writer.send(b'\0')
+        except OSError:
+            pass
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        self.selector.close()
+        for sock in (self.socket, self._wake_reader, self._wake_writer):
+            sock.close()
+
+    def _run(self):
+        while self.running:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.socket and self.running:
+                    self._drain()
+
+    def _drain(self):
+        self.stats['wakeups'] += 1
+        batch = []
+        offset = 0
+        while True:
+            if len(self.buffer) - offset < MAX_DATAGRAM:
+                # Out of room, hand this batch over so the buffer can be reused
+                self._deliver(batch)
+                batch = []
+                offset = 0
+            view = self.view[offset:]
+            try:
+                size, addr = self.socket.recvfrom_into(view)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                continue  # Windows reports ICMP port unreachable from an earlier send here
+            except OSError:
+                break  # Socket closed under us
+            batch.append((view[:size], addr))
+            offset += size
+        self._deliver(batch)
+
+    def _deliver(self, batch):
+        if not batch:
+            return
+        self.stats['datagrams'] += len(batch)
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+        self.on_datagrams(batch)